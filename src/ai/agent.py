@@ -3,15 +3,106 @@ EVOS AI - Agent System
 ReAct-style agent that can plan and execute multi-step tasks
 """
 import asyncio
+import functools
 import json
+import re
+import secrets
+import time
 from typing import Dict, Any, List, Optional, Callable, Awaitable
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, is_dataclass
 from datetime import datetime
 from enum import Enum
 
 from llm_engine import llm_engine
+from gemini_engine import _extract_first_json
 from tools import BrowserTools, ToolResult
 
+# Use orjson (Rust/SIMD) for the per-step dumps/loads hot paths, fall back to stdlib
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
+
+# msgspec decodes + validates the ReAct response schema in one C pass;
+# fall back to the generic JSON path when it isn't installed
+try:
+    import msgspec
+
+    class _AgentStepMsg(msgspec.Struct):
+        thought: str = ""
+        action: Optional[str] = None
+        action_input: Optional[Dict[str, Any]] = None
+
+    _STEP_DECODER = msgspec.json.Decoder(_AgentStepMsg)
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+# Rendered once at import so the tool catalog is byte-identical across calls
+# (stable prompt prefix = provider-side prompt cache hits)
+_TOOLS_PROMPT = BrowserTools.format_tools_for_prompt()
+
+# Collapse whitespace runs in C instead of allocating a token list per call
+_WS_RE = re.compile(r"\s+")
+
+# Offset for converting monotonic step timestamps to wall time on demand
+_MONO_WALL_OFFSET = time.time() - time.monotonic()
+
+
+@functools.lru_cache(maxsize=128)
+def _summarize_content(content: str, max_length: int = 2000) -> str:
+    """Summarize page content for the prompt.
+
+    Memoized: the same tab content recurs across turns, and returning the
+    identical string keeps the context block byte-stable for provider-side
+    prompt caching.
+    """
+    if not content:
+        return "No content available"
+
+    # Collapse whitespace runs in the C regex engine and truncate
+    content = _WS_RE.sub(" ", content)
+    if len(content) > max_length:
+        content = content[:max_length] + "..."
+
+    return content
+
+
+def _element_signature(elements: List[Dict]) -> tuple:
+    """Hashable signature of the element list, usable as a cache key"""
+    return tuple(
+        (el.get('tag'), el.get('text'), el.get('id'), el.get('name'), el.get('type'), el.get('href'))
+        for el in elements
+    )
+
+
+def _fmt_el(tag, text, id_, name, type_, href) -> str:
+    """Format one interactive element as a single prompt line"""
+    return (
+        f"[{tag or '?'}]"
+        + (f" '{text[:50]}'" if text else "")
+        + (f" id={id_}" if id_ else "")
+        + (f" name={name}" if name else "")
+        + (f" type={type_}" if type_ else "")
+        + (f" -> {href[:50]}" if href else "")
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _format_elements(signature: tuple) -> str:
+    """Format interactive elements for the prompt, memoized per element set"""
+    if not signature:
+        return "No interactive elements detected"
+
+    # Single output allocation instead of per-element list appends
+    return "\n".join(_fmt_el(*el) for el in signature)
+
 
 class AgentState(str, Enum):
     IDLE = "idle"
@@ -29,7 +120,14 @@ class AgentStep:
     action: Optional[str] = None
     action_input: Optional[Dict[str, Any]] = None
     observation: Optional[str] = None
-    timestamp: datetime = field(default_factory=datetime.now)
+    # Monotonic nanoseconds: one cheap clock read per step instead of the
+    # full datetime.now() construction; convert via wall_time when exporting
+    timestamp: int = field(default_factory=time.monotonic_ns)
+
+    @property
+    def wall_time(self) -> datetime:
+        """Wall-clock time of this step, derived lazily from the monotonic stamp"""
+        return datetime.fromtimestamp(self.timestamp / 1e9 + _MONO_WALL_OFFSET)
 
 
 @dataclass
@@ -51,7 +149,10 @@ class Agent:
     to accomplish tasks through tool use.
     """
     
-    SYSTEM_PROMPT = """You are EVOS, an intelligent browser agent. You help users accomplish tasks on web pages by using available tools.
+    # Static prefix: never re-formatted per task, so providers that cache
+    # prompt prefixes (Gemini/Ollama KV reuse) skip re-prefilling it.
+    # Page-specific context goes into DYNAMIC_CONTEXT_TEMPLATE instead.
+    STATIC_SYSTEM_PROMPT = """You are EVOS, an intelligent browser agent. You help users accomplish tasks on web pages by using available tools.
 
 You follow the ReAct pattern:
 1. THOUGHT: Analyze the current situation and decide what to do next
@@ -59,14 +160,6 @@ You follow the ReAct pattern:
 3. OBSERVATION: Analyze the result
 4. Repeat until task is complete
 
-Current page context:
-URL: {url}
-Title: {title}
-Page content summary: {content_summary}
-
-Interactive elements on page:
-{interactive_elements}
-
 {tools}
 
 IMPORTANT RULES:
@@ -88,7 +181,17 @@ Or if you're done:
     "thought": "Task completed because...",
     "action": "answer_user",
     "action_input": {{"message": "Here's what I found/did..."}}
-}}"""
+}}""".format(tools=_TOOLS_PROMPT)
+
+    # Volatile per-page context, sent as part of the first user message so
+    # the system prompt above stays cacheable
+    DYNAMIC_CONTEXT_TEMPLATE = """Current page context:
+URL: {url}
+Title: {title}
+Page content summary: {content_summary}
+
+Interactive elements on page:
+{interactive_elements}"""
 
     def __init__(self, max_steps: int = 10):
         self.max_steps = max_steps
@@ -116,10 +219,8 @@ Or if you're done:
         Returns:
             AgentTask with results
         """
-        import uuid
-        
         task = AgentTask(
-            task_id=str(uuid.uuid4()),
+            task_id=secrets.token_hex(16),
             description=task_description,
             context=context,
             state=AgentState.THINKING
@@ -130,34 +231,42 @@ Or if you're done:
         interactive_elements = context.get("interactive_elements", [])
         elements_str = self._format_elements(interactive_elements[:30])  # Limit to 30
         
-        # Build system prompt
-        system_prompt = self.SYSTEM_PROMPT.format(
+        # Static system prompt + page context in the first user message,
+        # so the system prompt is identical across tasks
+        system_prompt = self.STATIC_SYSTEM_PROMPT
+        page_context = self.DYNAMIC_CONTEXT_TEMPLATE.format(
             url=context.get("url", "unknown"),
             title=context.get("title", "unknown"),
             content_summary=self._summarize_content(context.get("content", "")),
-            interactive_elements=elements_str,
-            tools=BrowserTools.format_tools_for_prompt()
+            interactive_elements=elements_str
         )
-        
-        # Conversation history for multi-turn
-        messages = [
-            f"User task: {task_description}\n\nBegin by analyzing the page and planning your approach."
+
+        # Conversation history for multi-turn: a proper chat message list,
+        # so each step only appends a new turn instead of rebuilding and
+        # resending one ever-growing prompt string
+        messages: List[Dict[str, str]] = [
+            {
+                "role": "user",
+                "content": f"{page_context}\n\nUser task: {task_description}\n\nBegin by analyzing the page and planning your approach."
+            }
         ]
-        
+
         for step_num in range(1, self.max_steps + 1):
             task.state = AgentState.THINKING
-            
-            # Build prompt with history
-            prompt = "\n\n".join(messages)
-            
+
+            # Bound prompt growth on long tasks
+            if step_num > 3:
+                await self._maybe_compact(messages)
+
             # Get LLM response
             response = await llm_engine.generate(
-                prompt=prompt,
                 system_prompt=system_prompt,
                 temperature=0.3,
-                max_tokens=1024
+                max_tokens=1024,
+                messages=messages
             )
-            
+            messages.append({"role": "assistant", "content": response})
+
             # Parse response
             step = self._parse_response(response, step_num)
             task.steps.append(step)
@@ -178,17 +287,18 @@ Or if you're done:
                 
                 try:
                     result = await self.tool_executor(step.action, step.action_input or {})
-                    step.observation = json.dumps(result.__dict__ if hasattr(result, '__dict__') else result)
+                    step.observation = _dumps(asdict(result) if is_dataclass(result) else result)
                 except Exception as e:
                     step.observation = f"Error executing {step.action}: {str(e)}"
                     task.state = AgentState.ERROR
                 
-                # Add observation to history
-                messages.append(f"Step {step_num}:\nThought: {step.thought}\nAction: {step.action}\nAction Input: {json.dumps(step.action_input)}\nObservation: {step.observation}")
-            
+                # Add observation to history (the assistant turn above already
+                # records thought/action verbatim)
+                messages.append({"role": "user", "content": f"Observation: {step.observation}"})
+
             # Check for errors
             if step.action is None:
-                messages.append(f"Your response wasn't valid JSON. Please respond with proper JSON format.")
+                messages.append({"role": "user", "content": "Your response wasn't valid JSON. Please respond with proper JSON format."})
         
         if task.state != AgentState.COMPLETED:
             task.state = AgentState.ERROR
@@ -196,62 +306,74 @@ Or if you're done:
         
         return task
     
+    # History compaction: once the transcript passes roughly 6k tokens
+    # (~4 chars/token heuristic), older turns are folded into one digest
+    COMPACT_CHAR_THRESHOLD = 24000
+    KEEP_VERBATIM_TURNS = 4  # last two thought/observation pairs stay verbatim
+
+    async def _maybe_compact(self, messages: List[Dict[str, str]]):
+        """Collapse older turns into a rolling digest to bound prompt growth.
+
+        Without this the full history is resent every step — O(N^2) bytes
+        re-tokenized over a 10-step task. The digest keeps per-turn prompt
+        size roughly constant while the last few steps stay verbatim.
+        """
+        total = sum(len(m["content"]) for m in messages)
+        if total <= self.COMPACT_CHAR_THRESHOLD or len(messages) <= self.KEEP_VERBATIM_TURNS + 1:
+            return
+
+        head = messages[:-self.KEEP_VERBATIM_TURNS]
+        transcript = "\n\n".join(f"{m['role']}: {m['content']}" for m in head)
+        summary = await llm_engine.generate(
+            prompt=(
+                "Summarize the following agent trajectory in at most 300 tokens. "
+                "Preserve element IDs, URLs, tool names and key observations.\n\n"
+                + transcript
+            ),
+            temperature=0.1,
+            max_tokens=400,
+            use_cache=False
+        )
+        messages[:-self.KEEP_VERBATIM_TURNS] = [
+            {"role": "user", "content": f"Summary of earlier steps:\n{summary}"}
+        ]
+
     def _parse_response(self, response: str, step_num: int) -> AgentStep:
         """Parse LLM response into an AgentStep"""
         step = AgentStep(step_number=step_num, thought="")
-        
-        try:
-            # Find JSON in response
+
+        # Fast path: typed decode straight into the step schema
+        if MSGSPEC_AVAILABLE:
             start = response.find("{")
-            end = response.rfind("}") + 1
-            
-            if start >= 0 and end > start:
-                json_str = response[start:end]
-                data = json.loads(json_str)
-                
-                step.thought = data.get("thought", "")
-                step.action = data.get("action")
-                step.action_input = data.get("action_input", {})
-            else:
-                step.thought = response
-        except json.JSONDecodeError:
+            end = response.rfind("}")
+            if 0 <= start < end:
+                try:
+                    msg = _STEP_DECODER.decode(response[start:end + 1])
+                    step.thought = msg.thought
+                    step.action = msg.action
+                    step.action_input = msg.action_input or {}
+                    return step
+                except msgspec.DecodeError:
+                    pass
+
+        # Legacy path: find the first complete JSON object in the response
+        data = _extract_first_json(response)
+        if data is not None:
+            step.thought = data.get("thought", "")
+            step.action = data.get("action")
+            step.action_input = data.get("action_input", {})
+        else:
             step.thought = response
-        
+
         return step
     
     def _format_elements(self, elements: List[Dict]) -> str:
-        """Format interactive elements for the prompt"""
-        if not elements:
-            return "No interactive elements detected"
-        
-        lines = []
-        for el in elements:
-            desc = f"[{el.get('tag', '?')}]"
-            if el.get('text'):
-                desc += f" '{el['text'][:50]}'"
-            if el.get('id'):
-                desc += f" id={el['id']}"
-            if el.get('name'):
-                desc += f" name={el['name']}"
-            if el.get('type'):
-                desc += f" type={el['type']}"
-            if el.get('href'):
-                desc += f" -> {el['href'][:50]}"
-            lines.append(desc)
-        
-        return "\n".join(lines)
-    
+        """Format interactive elements for the prompt (memoized module-level)"""
+        return _format_elements(_element_signature(elements))
+
     def _summarize_content(self, content: str, max_length: int = 2000) -> str:
-        """Summarize page content for the prompt"""
-        if not content:
-            return "No content available"
-        
-        # Clean and truncate
-        content = " ".join(content.split())
-        if len(content) > max_length:
-            content = content[:max_length] + "..."
-        
-        return content
+        """Summarize page content for the prompt (memoized module-level)"""
+        return _summarize_content(content, max_length)
     
     async def stop(self):
         """Stop the current task"""
@@ -302,20 +424,17 @@ Be concise and helpful."""
         )
         
         # Check if response contains a command
-        try:
-            if "{" in response and "command" in response:
+        if "command" in response:
+            data = _extract_first_json(response)
+            if data is not None and data.get("command"):
                 start = response.find("{")
-                end = response.rfind("}") + 1
-                data = json.loads(response[start:end])
                 return {
                     "type": "command",
                     "command": data.get("command"),
                     "params": data.get("params", {}),
                     "message": response[:start].strip() if start > 0 else ""
                 }
-        except:
-            pass
-        
+
         return {
             "type": "text",
             "message": response
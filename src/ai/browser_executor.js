@@ -0,0 +1,303 @@
+(function() {
+    window.EVOSTools = {
+        // When the host binds window.__evosStream, large result arrays go
+        // out in chunks so no single JSON.stringify buffer holds them all;
+        // otherwise fall back to the one-blob response
+        _emit: function(results) {
+            if (typeof window.__evosStream === 'function') {
+                for (let i = 0; i < results.length; i += 200) {
+                    window.__evosStream(results.slice(i, i + 200));
+                }
+                if (typeof window.__evosStreamEnd === 'function') {
+                    window.__evosStreamEnd();
+                }
+                return { success: true, streamed: true, count: results.length };
+            }
+            return { success: true, data: results };
+        },
+
+        click: async function(selector, description) {
+            let element = document.querySelector(selector);
+            if (!element && description) {
+                // Text fallback: walk only clickable-ish tags instead of
+                // materializing textContent for every node in the DOM
+                const q = description.toLowerCase();
+                const clickable = /^(A|BUTTON|INPUT|LABEL|SPAN|DIV|LI)$/;
+                const walker = document.createTreeWalker(
+                    document.body,
+                    NodeFilter.SHOW_ELEMENT,
+                    {
+                        acceptNode: n =>
+                            clickable.test(n.tagName) && n.textContent.toLowerCase().includes(q)
+                                ? NodeFilter.FILTER_ACCEPT
+                                : NodeFilter.FILTER_SKIP
+                    }
+                );
+                element = walker.nextNode();
+            }
+            if (element) {
+                element.click();
+                return { success: true };
+            }
+            return { success: false, error: 'Element not found' };
+        },
+        
+        typeText: function(selector, text, clearFirst) {
+            const element = document.querySelector(selector);
+            if (element) {
+                if (clearFirst) element.value = '';
+                element.value += text;
+                element.dispatchEvent(new Event('input', { bubbles: true }));
+                element.dispatchEvent(new Event('change', { bubbles: true }));
+                return { success: true };
+            }
+            return { success: false, error: 'Element not found' };
+        },
+        
+        scroll: function(direction, amount) {
+            const scrollAmount = amount || 500;
+            switch(direction) {
+                case 'up': window.scrollBy(0, -scrollAmount); break;
+                case 'down': window.scrollBy(0, scrollAmount); break;
+                case 'top': window.scrollTo(0, 0); break;
+                case 'bottom': window.scrollTo(0, document.body.scrollHeight); break;
+            }
+            return { success: true };
+        },
+        
+        extractText: function(selector, multiple) {
+            if (multiple) {
+                const elements = document.querySelectorAll(selector);
+                return { success: true, data: Array.from(elements).map(el => el.textContent.trim()) };
+            }
+            const element = document.querySelector(selector);
+            return element 
+                ? { success: true, data: element.textContent.trim() }
+                : { success: false, error: 'Element not found' };
+        },
+        
+        extractLinks: function(selector, filter) {
+            const container = document.querySelector(selector || 'body');
+            if (!container) return { success: false, error: 'Container not found' };
+            
+            // Filter fused into the mapping pass: the filter string is
+            // lowercased once and rejected links never allocate an object
+            const links = container.querySelectorAll('a[href]');
+            const f = filter ? filter.toLowerCase() : null;
+            const results = [];
+            for (const a of links) {
+                const text = a.textContent.trim();
+                const href = a.href;
+                if (f && !text.toLowerCase().includes(f) && !href.toLowerCase().includes(f)) {
+                    continue;
+                }
+                results.push({ text, href });
+            }
+
+            return this._emit(results);
+        },
+        
+        extractTable: function(selector) {
+            const table = document.querySelector(selector);
+            if (!table) return { success: false, error: 'Table not found' };
+            
+            // Columnar output: header strings appear once instead of being
+            // repeated as keys on every row, and rows stay plain arrays.
+            // table.rows / row.cells are live HTMLCollections — no selector
+            // re-matching per row like querySelectorAll('td, th')
+            const trs = table.rows;
+            let headers = [];
+            const rows = [];
+
+            for (let i = 0; i < trs.length; i++) {
+                const cells = trs[i].cells;
+                const rowData = new Array(cells.length);
+                let hasTh = false;
+                for (let j = 0; j < cells.length; j++) {
+                    rowData[j] = cells[j].textContent.trim();
+                    if (cells[j].tagName === 'TH') hasTh = true;
+                }
+                if (i === 0 && hasTh) {
+                    headers = rowData;
+                } else {
+                    rows.push(rowData);
+                }
+            }
+
+            return { success: true, data: { headers, rows } };
+        },
+        
+        fillForm: function(formSelector, data, submit) {
+            const form = document.querySelector(formSelector);
+            if (!form) return { success: false, error: 'Form not found' };
+            
+            // One combined query instead of a selector walk per field;
+            // CSS.escape keeps keys with dots/colons from breaking (or
+            // widening) the selector
+            const entries = Object.entries(data);
+            const selectors = entries.map(([key]) => {
+                const k = CSS.escape(key);
+                return `[name="${k}"], #${k}, .${k}`;
+            });
+            const matched = form.querySelectorAll(selectors.join(', '));
+
+            for (const [key, value] of entries) {
+                let input = null;
+                for (const el of matched) {
+                    if (el.name === key || el.id === key ||
+                        (el.classList && el.classList.contains(key))) {
+                        input = el;
+                        break;
+                    }
+                }
+                if (input) {
+                    input.value = value;
+                    input.dispatchEvent(new Event('input', { bubbles: true }));
+                    input.dispatchEvent(new Event('change', { bubbles: true }));
+                }
+            }
+            
+            if (submit) {
+                form.submit();
+            }
+            
+            return { success: true };
+        },
+        
+        getPageInfo: function() {
+            // body.innerText forces a full style+layout pass and materializes
+            // the whole page before slicing; walk text nodes and stop at the
+            // budget instead, so cost tracks the output, not the page
+            const limit = 10000;
+            const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+            const chunks = [];
+            let total = 0;
+            let node;
+            while (total < limit && (node = walker.nextNode())) {
+                const value = node.nodeValue.trim();
+                if (value) {
+                    chunks.push(value);
+                    total += value.length + 1;
+                }
+            }
+            return {
+                success: true,
+                data: {
+                    url: window.location.href,
+                    title: document.title,
+                    description: document.querySelector('meta[name="description"]')?.content || '',
+                    text: chunks.join(' ').slice(0, limit),
+                    forms: document.querySelectorAll('form').length,
+                    links: document.querySelectorAll('a').length,
+                    inputs: document.querySelectorAll('input, textarea, select').length
+                }
+            };
+        },
+        
+        selectOption: function(selector, value) {
+            const select = document.querySelector(selector);
+            if (!select) return { success: false, error: 'Select not found' };
+            
+            // Try by value
+            let option = select.querySelector(`option[value="${value}"]`);
+            // Try by text
+            if (!option) {
+                option = Array.from(select.options).find(o => 
+                    o.textContent.trim().toLowerCase() === value.toLowerCase()
+                );
+            }
+            
+            if (option) {
+                select.value = option.value;
+                select.dispatchEvent(new Event('change', { bubbles: true }));
+                return { success: true };
+            }
+            return { success: false, error: 'Option not found' };
+        },
+        
+        hover: function(selector) {
+            const element = document.querySelector(selector);
+            if (element) {
+                element.dispatchEvent(new MouseEvent('mouseenter', { bubbles: true }));
+                element.dispatchEvent(new MouseEvent('mouseover', { bubbles: true }));
+                return { success: true };
+            }
+            return { success: false, error: 'Element not found' };
+        },
+        
+        getInteractiveElements: function() {
+            const selectors = 'a, button, input, select, textarea, [onclick], [role="button"]';
+            const nodes = Array.from(document.querySelectorAll(selectors));
+            // Layout reads first, in one tight pass, so nothing interleaves
+            // a style read with work that could invalidate layout
+            const rects = nodes.map(el => el.getBoundingClientRect());
+            // Rects travel as one flat [x, y, w, h, ...] buffer parallel to
+            // meta: 4 numbers per element instead of a 4-key object, which
+            // is most of the JSON weight on element-dense pages. Float32Array
+            // keeps the build allocation-free; it's flattened to a plain
+            // array at the end because the payload crosses JSON.
+            const meta = [];
+            const rectsBuf = new Float32Array(nodes.length * 4);
+            let k = 0;
+            for (let i = 0; i < nodes.length; i++) {
+                const rect = rects[i];
+                if (rect.width > 0 && rect.height > 0) {
+                    const el = nodes[i];
+                    meta.push({
+                        index: i,
+                        tag: el.tagName.toLowerCase(),
+                        type: el.type || '',
+                        text: el.textContent?.trim().substring(0, 100) || '',
+                        placeholder: el.placeholder || '',
+                        id: el.id,
+                        name: el.name,
+                        href: el.href
+                    });
+                    rectsBuf[k * 4] = rect.x;
+                    rectsBuf[k * 4 + 1] = rect.y;
+                    rectsBuf[k * 4 + 2] = rect.width;
+                    rectsBuf[k * 4 + 3] = rect.height;
+                    k++;
+                }
+            }
+            const flatRects = Array.from(rectsBuf.subarray(0, k * 4));
+            const res = this._emit(meta);
+            if (res.streamed) {
+                // Meta went out in chunks; the compact rect buffer rides in
+                // the closing frame
+                return { success: true, streamed: true, count: res.count, data: { rects: flatRects } };
+            }
+            return { success: true, data: { meta, rects: flatRects } };
+        },
+
+        executeBatch: async function(commands) {
+            // One IPC frame carries N commands; results come back as one array
+            const dispatch = {
+                click: p => this.click(p.selector, p.description),
+                type_text: p => this.typeText(p.selector, p.text, p.clear_first),
+                scroll: p => this.scroll(p.direction, p.amount),
+                extract_text: p => this.extractText(p.selector, p.multiple),
+                extract_links: p => this.extractLinks(p.selector, p.filter),
+                extract_table: p => this.extractTable(p.selector),
+                fill_form: p => this.fillForm(p.form_selector, p.data, p.submit),
+                get_page_info: () => this.getPageInfo(),
+                select_option: p => this.selectOption(p.selector, p.value),
+                hover: p => this.hover(p.selector)
+            };
+            const results = [];
+            for (const cmd of commands) {
+                const fn = dispatch[cmd.tool];
+                if (!fn) {
+                    results.push({ success: false, error: 'Unknown tool: ' + cmd.tool });
+                    continue;
+                }
+                try {
+                    results.push(await fn(cmd.parameters || {}));
+                } catch (e) {
+                    results.push({ success: false, error: String(e) });
+                }
+            }
+            return { success: true, data: results };
+        }
+    };
+})();
@@ -3,8 +3,11 @@ EVOS AI - Gemini Engine
 Handles communication with Google Gemini API
 """
 import asyncio
+import concurrent.futures
+import functools
 import json
 import os
+import threading
 from typing import Optional, AsyncGenerator, Dict, Any, List
 import google.generativeai as genai
 from google.generativeai.types import content_types
@@ -12,6 +15,103 @@ from google.ai.generativelanguage import Content, Part
 
 from config import settings
 
+# orjson for response-parsing hot paths, stdlib json as fallback
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _extract_first_json(text: str) -> Optional[Dict[str, Any]]:
+    """Return the first complete JSON object embedded in text, or None.
+
+    Walks the string with raw_decode in a single left-to-right pass
+    instead of the old find('{')/rfind('}') slicing, which rescanned the
+    whole response and mis-parsed when prose contained braces.
+    """
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        if isinstance(obj, dict):
+            return obj
+        start = text.find("{", start + 1)
+    return None
+
+
+def _tools_cache_key(tools: List[Dict[str, Any]]) -> tuple:
+    """Hashable signature of a tool spec list, usable as an lru_cache key"""
+    return tuple(
+        (t["name"], t["description"], json.dumps(t.get("parameters", {}), sort_keys=True, default=str))
+        for t in tools
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _tool_descriptions(tools_key: tuple) -> str:
+    """Render the tool description block once per distinct tool spec.
+
+    The tool list is static in practice, so this avoids re-serializing
+    every parameter dict on each call and keeps the resulting prompt
+    byte-identical (stable prefix for provider-side prompt caching).
+    """
+    return "\n".join(
+        f"- {name}: {description}\n  Parameters: {params_json}"
+        for name, description, params_json in tools_key
+    )
+
+
+# Map our JSON-schema-ish parameter types onto Gemini proto types
+_GEMINI_TYPE_MAP = {
+    "string": genai.protos.Type.STRING,
+    "boolean": genai.protos.Type.BOOLEAN,
+    "integer": genai.protos.Type.INTEGER,
+    "number": genai.protos.Type.NUMBER,
+    "object": genai.protos.Type.OBJECT,
+    "array": genai.protos.Type.ARRAY,
+}
+
+
+def _json_schema_to_proto(parameters: Dict[str, Any]) -> Optional[Any]:
+    """Convert a tool parameter dict to a genai.protos.Schema"""
+    if not parameters:
+        return None
+    properties = {}
+    required = []
+    for name, spec in parameters.items():
+        properties[name] = genai.protos.Schema(
+            type=_GEMINI_TYPE_MAP.get(str(spec.get("type", "string")), genai.protos.Type.STRING),
+            description=spec.get("description", "")
+        )
+        if "default" not in spec:
+            required.append(name)
+    return genai.protos.Schema(
+        type=genai.protos.Type.OBJECT,
+        properties=properties,
+        required=required
+    )
+
+
+def _to_gemini_tools(tools: List[Dict[str, Any]]) -> List[Any]:
+    """Convert generic tool definitions to Gemini function declarations"""
+    declarations = [
+        genai.protos.FunctionDeclaration(
+            name=t["name"],
+            description=t["description"],
+            parameters=_json_schema_to_proto(t.get("parameters", {}))
+        )
+        for t in tools
+    ]
+    return [genai.protos.Tool(function_declarations=declarations)]
+
+
 class GeminiEngine:
     """Online LLM engine using Google Gemini"""
     
@@ -20,6 +120,17 @@ class GeminiEngine:
         self.api_key = getattr(settings, "gemini_api_key", "")
         self._model_available = False
         self.model = None
+        # GenerativeModel instances keyed by system-prompt hash, so the
+        # common case (static agent system prompt) reuses one object
+        self._model_cache: Dict[int, Any] = {}
+        # Function-calling models keyed by (tool signature, system prompt)
+        self._tool_model_cache: Dict[Any, Any] = {}
+        # Bounded pool for the sync SDK calls: reuses threads (and the
+        # SDK's per-thread HTTP state) and caps concurrency, unlike
+        # asyncio.to_thread's shared default executor
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=8, thread_name_prefix="gemini"
+        )
         
     async def initialize(self) -> bool:
         """Initialize Gemini client"""
@@ -33,52 +144,96 @@ class GeminiEngine:
         try:
             genai.configure(api_key=self.api_key)
             self.model = genai.GenerativeModel(self.model_name)
+            self._model_cache.clear()  # key/model may have changed
+            self._tool_model_cache.clear()
             self._model_available = True
             print(f"[Gemini] Initialized {self.model_name}")
             return True
         except Exception as e:
             print(f"[Gemini] Initialization failed: {e}")
             return False
-            
+
+    # Chat system prompts embed page content, so distinct prompts keep
+    # arriving over a session; keep only a handful of recent models
+    MODEL_CACHE_MAX = 16
+
+    def _get_model(self, system_prompt: Optional[str] = None):
+        """Get a GenerativeModel for this system prompt, cached per prompt.
+
+        Rebuilding the model on every call threw away the SDK's internal
+        client state; identical system prompts now share one instance.
+        """
+        if not system_prompt:
+            return self.model
+        key = hash(system_prompt)
+        model = self._model_cache.get(key)
+        if model is None:
+            if len(self._model_cache) >= self.MODEL_CACHE_MAX:
+                self._model_cache.pop(next(iter(self._model_cache)))
+            model = genai.GenerativeModel(
+                self.model_name,
+                system_instruction=system_prompt
+            )
+            self._model_cache[key] = model
+        return model
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a sync SDK call on the dedicated thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, functools.partial(fn, *args, **kwargs)
+        )
+
     async def generate(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 2048,
-        stream: bool = False
+        stream: bool = False,
+        messages: Optional[List[Dict[str, str]]] = None
     ) -> str:
         """Generate a response from Gemini"""
         if not self._model_available:
             return "Gemini API Key missing or invalid."
-            
+
         try:
-            # Gemini 1.5 supports system instructions in constructor, 
+            # Gemini 1.5 supports system instructions in constructor,
             # but for simple calls we can prepend context or use chat history
-            
+
             # Simple content generation
             config = genai.types.GenerationConfig(
                 temperature=temperature,
                 max_output_tokens=max_tokens
             )
-            
-            full_prompt = prompt
-            if system_prompt:
-                # Flash follows system instructions well
-                self.model = genai.GenerativeModel(
-                    self.model_name,
-                    system_instruction=system_prompt
-                )
-            
-            # Run in executor to avoid blocking event loop (genai is sync mainly)
-            response = await asyncio.to_thread(
-                self.model.generate_content,
-                full_prompt,
+
+            if messages is not None:
+                # Map generic chat history to Gemini's content format
+                contents = [
+                    {"role": "model" if m["role"] == "assistant" else "user", "parts": [m["content"]]}
+                    for m in messages
+                ]
+            else:
+                contents = prompt
+            # Flash follows system instructions well
+            model = self._get_model(system_prompt)
+
+            # Run on the dedicated pool to avoid blocking event loop (genai is sync mainly)
+            response = await self._run(
+                model.generate_content,
+                contents,
                 generation_config=config,
                 stream=False
             )
-            
-            return response.text
+
+            # Read parts directly: the .text property re-runs validation and
+            # safety checks on every access
+            pieces = []
+            for candidate in response.candidates[:1]:
+                for part in candidate.content.parts:
+                    t = getattr(part, "text", None)
+                    if t:
+                        pieces.append(t)
+            return "".join(pieces)
         except Exception as e:
             print(f"[Gemini] Generation error: {e}")
             return f"Error: {e}"
@@ -100,55 +255,130 @@ class GeminiEngine:
                 temperature=temperature,
                 max_output_tokens=max_tokens
             )
-            
-            if system_prompt:
-                self.model = genai.GenerativeModel(
+
+            model = self._get_model(system_prompt)
+
+            # The SDK's stream iterator is sync and blocks its thread, so
+            # iterate it entirely on the worker pool and hand chunks to the
+            # event loop through a bounded queue. The queue applies natural
+            # backpressure and replaces the old per-chunk asyncio.sleep(0).
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue(maxsize=32)
+            # Set when the consumer goes away (a client disconnect cancels
+            # the websocket reader mid-stream, closing this generator); the
+            # producer polls it so a full queue can't park a pool thread
+            # forever
+            closed = threading.Event()
+
+            def _put(item) -> bool:
+                """Blocking put with an escape hatch; False once abandoned"""
+                fut = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+                while True:
+                    try:
+                        fut.result(timeout=0.5)
+                        return True
+                    except concurrent.futures.TimeoutError:
+                        if closed.is_set():
+                            fut.cancel()
+                            return False
+
+            def _produce():
+                try:
+                    response_stream = model.generate_content(
+                        prompt,
+                        generation_config=config,
+                        stream=True
+                    )
+                    for chunk in response_stream:
+                        if closed.is_set():
+                            return
+                        if not chunk.candidates:
+                            continue
+                        for part in chunk.candidates[0].content.parts:
+                            t = getattr(part, "text", None)
+                            if t and not _put(t):
+                                return
+                except Exception as e:
+                    _put(f"Error: {str(e)}")
+                finally:
+                    _put(None)
+
+            producer = loop.run_in_executor(self._pool, _produce)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    yield item
+            finally:
+                # Runs on normal completion and on early close alike: wake
+                # the producer and reclaim its thread before returning
+                closed.set()
+                await producer
+
+        except Exception as e:
+            yield f"Error: {str(e)}"
+
+    async def generate_with_tools(
+        self,
+        prompt: str,
+        tools: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Generate with Gemini's native function calling.
+
+        The tool schemas go through the API's function-declaration field
+        instead of being pasted into the prompt, which saves the schema
+        tokens per call and removes the fragile JSON post-parse. Falls
+        back to the prompt-engineered path on any conversion/API error.
+        """
+        if not self._model_available:
+            return {"type": "text", "content": "Gemini API Key missing or invalid."}
+
+        try:
+            key = _tools_cache_key(tools)
+            cached = self._tool_model_cache.get((key, system_prompt))
+            if cached is None:
+                if len(self._tool_model_cache) >= self.MODEL_CACHE_MAX:
+                    self._tool_model_cache.pop(next(iter(self._tool_model_cache)))
+                cached = genai.GenerativeModel(
                     self.model_name,
-                    system_instruction=system_prompt
+                    system_instruction=system_prompt or None,
+                    tools=_to_gemini_tools(tools)
                 )
+                self._tool_model_cache[(key, system_prompt)] = cached
 
-            # Sync stream generator
-            response_stream = await asyncio.to_thread(
-                self.model.generate_content,
+            response = await self._run(
+                cached.generate_content,
                 prompt,
-                generation_config=config,
-                stream=True
+                generation_config=genai.types.GenerationConfig(temperature=0.1)
             )
-            
-            # Iterate through sync iterator in async wrapper
-            for chunk in response_stream:
-                if chunk.text:
-                    yield chunk.text
-                    # Small yield to let event loop breathe
-                    await asyncio.sleep(0)
-                    
+
+            parts = response.candidates[0].content.parts
+            for part in parts:
+                fc = getattr(part, "function_call", None)
+                if fc and fc.name:
+                    return {
+                        "type": "tool_call",
+                        "tool": fc.name,
+                        "parameters": dict(fc.args) if fc.args else {},
+                        "raw_response": str(fc)
+                    }
+            text = "".join(p.text for p in parts if getattr(p, "text", None))
+            return {"type": "text", "content": text}
         except Exception as e:
-            yield f"Error: {str(e)}"
+            print(f"[Gemini] Function calling failed ({e}), using prompt-engineered tools")
+            return await self._generate_with_tools_prompted(prompt, tools, system_prompt)
 
-    async def generate_with_tools(
+    async def _generate_with_tools_prompted(
         self,
         prompt: str,
         tools: List[Dict[str, Any]],
         system_prompt: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Generate with Tool Calling (Function Calling)"""
-        # Note: We need to convert our generic tool JSON to Gemini's format
-        # For simplicity in this rough cut, we'll strip to generic prompt engineering 
-        # OR implement proper conversion. 
-        # Given 'flash' is smart, prompt engineering often works better for dynamic tools
-        # unless providing actual Python functions.
-        
-        # We will wrap the existing generic generic logic here to keep it simple for Hackathon
-        # (Switching to native function calling would require mapping schemas).
-        
-        # Re-use our "Tool Prompt" technique from llm_engine for consistent behavior
-        # But run it through Gemini.
-        
-        tool_descriptions = "\n".join([
-            f"- {tool['name']}: {tool['description']}\n  Parameters: {json.dumps(tool.get('parameters', {}))}"
-            for tool in tools
-        ])
-        
+        """Legacy prompt-engineered tool calling (fallback path)"""
+        tool_descriptions = _tool_descriptions(_tools_cache_key(tools))
+
         enhanced_system = f"""{system_prompt or 'You are a helpful AI assistant.'}
 
 You have access to the following tools:
@@ -162,39 +392,63 @@ Always think step by step before using tools."""
 
         response_text = await self.generate(prompt, enhanced_system, temperature=0.1)
         
-        try:
-            if "{" in response_text and "}" in response_text:
-                start = response_text.find("{")
-                end = response_text.rfind("}") + 1
-                json_str = response_text[start:end]
-                parsed = json.loads(json_str)
-                if "tool" in parsed:
-                    return {
-                        "type": "tool_call",
-                        "tool": parsed["tool"],
-                        "parameters": parsed.get("parameters", {}),
-                        "raw_response": response_text
-                    }
-        except:
-            pass
-            
+        parsed = _extract_first_json(response_text)
+        if parsed and "tool" in parsed:
+            return {
+                "type": "tool_call",
+                "tool": parsed["tool"],
+                "parameters": parsed.get("parameters", {}),
+                "raw_response": response_text
+            }
+
         return {"type": "text", "content": response_text}
 
     async def embeddings(self, text: str) -> List[float]:
-        """Generate embeddings using embedding-001"""
-        if not self._model_available:
+        """Generate embeddings for a single text (thin wrapper over the batch path)"""
+        vectors = await self._embed_raw([text])
+        return vectors[0] if vectors else []
+
+    async def _embed_raw(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts in one RPC (the API accepts a list)"""
+        if not self._model_available or not texts:
             return []
         try:
-            result = await asyncio.to_thread(
+            result = await self._run(
                 genai.embed_content,
                 model="models/text-embedding-004", # Latest small embedding
-                content=text,
+                content=texts,
                 task_type="retrieval_document"
             )
-            return result['embedding']
+            embedding = result['embedding']
+            # Single input returns a flat vector, batches return a list of them
+            if embedding and not isinstance(embedding[0], list):
+                return [embedding]
+            return embedding
         except Exception as e:
             print(f"[Gemini] Embedding error: {e}")
             return []
 
+    async def embeddings_batch(self, texts: List[str]):
+        """Embed many texts in one RPC and quantize to int8.
+
+        Batching amortizes the HTTPS round-trip across documents, and
+        symmetric int8 quantization (scale = max|x| / 127) cuts vector
+        memory and search bandwidth 4x versus FP32.
+
+        Returns:
+            (vectors, scales): int8 ndarray of shape (n, dim) and the
+            per-row float32 scales needed to dequantize.
+        """
+        import numpy as np
+
+        raw = await self._embed_raw(texts)
+        if not raw:
+            return None, None
+        vecs = np.asarray(raw, dtype=np.float32)
+        scales = np.max(np.abs(vecs), axis=1, keepdims=True)
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vecs * (127.0 / scales)), -127, 127).astype(np.int8)
+        return quantized, (scales / 127.0).astype(np.float32).ravel()
+
     async def close(self):
-        pass
+        self._pool.shutdown(wait=False)
@@ -3,11 +3,123 @@ EVOS AI - LLM Engine Manager
 Handles dynamic switching between Offline (Ollama) and Online (Gemini) engines
 """
 import asyncio
+import hashlib
 import json
-from typing import Optional, AsyncGenerator, Dict, Any, List
+import time
+from typing import Optional, AsyncGenerator, Dict, Any, List, Tuple
 import httpx
 from config import settings
-from gemini_engine import GeminiEngine
+from gemini_engine import GeminiEngine, _tools_cache_key, _tool_descriptions, _extract_first_json
+
+# orjson parses/serializes several times faster than stdlib json; the streaming
+# loop decodes one JSON frame per token so this is a hot path
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
+
+class ResponseCache:
+    """Two-tier cache for LLM responses.
+
+    Tier 1 is an exact-match lookup keyed on a hash of system prompt,
+    prompt/messages and temperature. Tier 2 is a semantic match: if a
+    cached prompt embedding is cosine-similar above a threshold (and the
+    system prompt is identical, so page context can't bleed across tabs),
+    the cached response is reused. Entries expire after a TTL so stale
+    page answers age out.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: float = 300.0, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # key -> (timestamp, sys_key, embedding or None, response)
+        self._entries: Dict[bytes, Tuple[float, bytes, Optional[List[float]], str]] = {}
+
+    @staticmethod
+    def make_key(system_prompt: Optional[str], prompt: str, messages: Optional[List[Dict[str, str]]], temperature: float) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        h.update((system_prompt or "").encode())
+        h.update(b"\x00")
+        h.update(prompt.encode())
+        if messages:
+            for m in messages:
+                h.update(b"\x00")
+                h.update(m.get("role", "").encode())
+                h.update(b":")
+                h.update(m.get("content", "").encode())
+        h.update(f"|{temperature}".encode())
+        return h.digest()
+
+    @staticmethod
+    def _scope_key(system_prompt: Optional[str], temperature: float) -> bytes:
+        """Scope for semantic matches: same system prompt, same sampling.
+
+        Temperature is part of the exact key, so the semantic tier has to
+        honour it too or a rephrasing at a different temperature would be
+        served a response generated under other sampling settings.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        h.update((system_prompt or "").encode())
+        h.update(f"|{temperature}".encode())
+        return h.digest()
+
+    def get(self, key: bytes) -> Optional[str]:
+        """Exact-match lookup"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            return None
+        return entry[3]
+
+    def find_similar(self, system_prompt: Optional[str], temperature: float, embedding: List[float]) -> Optional[str]:
+        """Semantic lookup: best cosine match above the threshold"""
+        if not embedding:
+            return None
+        sys_key = self._scope_key(system_prompt, temperature)
+        now = time.monotonic()
+        q_norm = sum(x * x for x in embedding) ** 0.5
+        if q_norm == 0:
+            return None
+        best_score, best_response = 0.0, None
+        for ts, entry_sys, vec, response in self._entries.values():
+            if vec is None or entry_sys != sys_key or now - ts > self.ttl:
+                continue
+            dot = sum(a * b for a, b in zip(embedding, vec))
+            v_norm = sum(x * x for x in vec) ** 0.5
+            if v_norm == 0:
+                continue
+            score = dot / (q_norm * v_norm)
+            if score > best_score:
+                best_score, best_response = score, response
+        if best_score >= self.similarity_threshold:
+            return best_response
+        return None
+
+    def put(self, key: bytes, system_prompt: Optional[str], temperature: float, embedding: Optional[List[float]], response: str):
+        if len(self._entries) >= self.max_entries:
+            # Evict the oldest entry
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+        self._entries[key] = (time.monotonic(), self._scope_key(system_prompt, temperature), embedding, response)
+
+    def attach_embedding(self, key: bytes, embedding: List[float]):
+        """Backfill the vector on an entry stored before its embedding landed"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is None:
+            self._entries[key] = (entry[0], entry[1], embedding, entry[3])
+
+    def clear(self):
+        self._entries.clear()
+
 
 class OllamaEngine:
     """Local LLM engine using Ollama (Legacy Implementation)"""
@@ -15,14 +127,22 @@ class OllamaEngine:
     def __init__(self):
         self.base_url = settings.ollama_host
         self.model = settings.default_model
-        self.client = httpx.AsyncClient(timeout=120.0)
+        # One long-lived client: HTTP/2 multiplexes concurrent generate/embedding
+        # requests over a single pooled connection instead of paying a fresh
+        # TCP handshake (and HTTP/1.1 head-of-line blocking) per call
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=True,
+            timeout=httpx.Timeout(120.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
         self._model_available = False
         
     async def initialize(self) -> bool:
         """Check if Ollama is running and model is available"""
         try:
             # Check if Ollama is running
-            response = await self.client.get(f"{self.base_url}/api/tags")
+            response = await self.client.get("/api/tags")
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 model_names = [m["name"] for m in models]
@@ -47,15 +167,20 @@ class OllamaEngine:
             print(f"[Ollama] Not available: {e}")
             return False
     
-    async def generate(self, prompt: str, system_prompt: Optional[str] = None, temperature: float = 0.7, max_tokens: int = 2048, stream: bool = False) -> str:
+    async def generate(self, prompt: str = "", system_prompt: Optional[str] = None, temperature: float = 0.7, max_tokens: int = 2048, stream: bool = False, messages: Optional[List[Dict[str, str]]] = None) -> str:
         if not self._model_available: return "Ollama not available."
-        messages = []
-        if system_prompt: messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        chat_messages = []
+        if system_prompt: chat_messages.append({"role": "system", "content": system_prompt})
+        if messages is not None:
+            # Multi-turn history passed through verbatim so earlier turns
+            # stay byte-identical for the provider's prefix cache
+            chat_messages.extend(messages)
+        else:
+            chat_messages.append({"role": "user", "content": prompt})
         try:
             response = await self.client.post(
-                f"{self.base_url}/api/chat",
-                json={"model": self.model, "messages": messages, "stream": False, "options": {"temperature": temperature, "num_predict": max_tokens}}
+                "/api/chat",
+                json={"model": self.model, "messages": chat_messages, "stream": False, "options": {"temperature": temperature, "num_predict": max_tokens}}
             )
             if response.status_code == 200:
                 return response.json().get("message", {}).get("content", "")
@@ -71,20 +196,33 @@ class OllamaEngine:
         if system_prompt: messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
         try:
-            async with self.client.stream("POST", f"{self.base_url}/api/chat", json={"model": self.model, "messages": messages, "stream": True, "options": {"temperature": temperature, "num_predict": max_tokens}}) as response:
-                async for line in response.aiter_lines():
-                    if line:
+            async with self.client.stream("POST", "/api/chat", json={"model": self.model, "messages": messages, "stream": True, "options": {"temperature": temperature, "num_predict": max_tokens}}) as response:
+                # Split NDJSON frames from raw byte chunks ourselves: one
+                # bytes-level scan instead of aiter_lines' per-line Python
+                # buffering and str decode
+                buf = bytearray()
+                async for chunk in response.aiter_bytes(chunk_size=65536):
+                    buf += chunk
+                    while True:
+                        nl = buf.find(b"\n")
+                        if nl < 0:
+                            break
+                        frame = bytes(buf[:nl])
+                        del buf[:nl + 1]
+                        if not frame.strip():
+                            continue
                         try:
-                            data = json.loads(line)
-                            content = data.get("message", {}).get("content", "")
-                            if content: yield content
-                        except: continue
+                            data = _loads(frame)
+                        except ValueError:
+                            continue
+                        content = data.get("message", {}).get("content")
+                        if content: yield content
         except Exception as e:
             yield f"Error: {str(e)}"
 
     async def generate_with_tools(self, prompt: str, tools: List[Dict[str, Any]], system_prompt: Optional[str] = None) -> Dict[str, Any]:
         """Generate response with tool/function calling capability (Prompt Engineering)"""
-        tool_descriptions = "\n".join([f"- {tool['name']}: {tool['description']}\n  Parameters: {json.dumps(tool.get('parameters', {}))}" for tool in tools])
+        tool_descriptions = _tool_descriptions(_tools_cache_key(tools))
         enhanced_system = f"""{system_prompt or 'You are a helpful AI assistant.'}
 You have access to the following tools:
 {tool_descriptions}
@@ -93,20 +231,14 @@ When you need to use a tool, respond with JSON in this exact format:
 If you don't need a tool, just respond normally with text.
 Always think step by step before using tools."""
         response = await self.generate(prompt, enhanced_system, temperature=0.3)
-        try:
-            if "{" in response and "}" in response:
-                start = response.find("{")
-                end = response.rfind("}") + 1
-                json_str = response[start:end]
-                parsed = json.loads(json_str)
-                if "tool" in parsed:
-                    return {"type": "tool_call", "tool": parsed["tool"], "parameters": parsed.get("parameters", {}), "raw_response": response}
-        except: pass
+        parsed = _extract_first_json(response)
+        if parsed and "tool" in parsed:
+            return {"type": "tool_call", "tool": parsed["tool"], "parameters": parsed.get("parameters", {}), "raw_response": response}
         return {"type": "text", "content": response}
 
     async def embeddings(self, text: str) -> List[float]:
         try:
-            response = await self.client.post(f"{self.base_url}/api/embeddings", json={"model": self.model, "prompt": text})
+            response = await self.client.post("/api/embeddings", json={"model": self.model, "prompt": text})
             if response.status_code == 200: return response.json().get("embedding", [])
             return []
         except: return []
@@ -125,6 +257,7 @@ class LLMEngine:
         self.active_engine = self.ollama if self.mode == 'offline' else self.gemini
         self.model = self.active_engine.model
         self._model_available = False
+        self.response_cache = ResponseCache()
         
     async def initialize(self) -> bool:
         """Initialize both engines, set active based on config"""
@@ -156,6 +289,8 @@ class LLMEngine:
     async def switch_mode(self, mode: str) -> bool:
         """Switch between online and offline"""
         print(f"[LLM Manager] Switching to {mode}...")
+        # Cached responses came from the previous engine/model
+        self.response_cache.clear()
         if mode == 'online':
             if await self.gemini.initialize():
                 self.mode = 'online'
@@ -175,10 +310,78 @@ class LLMEngine:
         return False
 
     # Delegate methods
-    async def generate(self, *args, **kwargs):
-        return await self.active_engine.generate(*args, **kwargs)
+    async def generate(self, prompt: str = "", system_prompt: Optional[str] = None, temperature: float = 0.7, max_tokens: int = 2048, stream: bool = False, messages: Optional[List[Dict[str, str]]] = None, use_cache: bool = True):
+        if not use_cache:
+            return await self.active_engine.generate(prompt=prompt, system_prompt=system_prompt, temperature=temperature, max_tokens=max_tokens, stream=stream, messages=messages)
+
+        # Exact-hash hit: skip the round trip entirely
+        key = ResponseCache.make_key(system_prompt, prompt, messages, temperature)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Semantic tier for single-prompt calls: near-identical rephrasings
+        # reuse the answer, scoped to the same system prompt and temperature.
+        # On Ollama the embedding is a forward pass of the chat model, so it
+        # races the generation instead of serializing in front of it: a
+        # semantic hit cancels the in-flight generation, and a generation
+        # that wins never waits on the embedding.
+        if messages is None and prompt and self._model_available:
+            embed_task = asyncio.create_task(self._embed_for_cache(prompt))
+            gen_task = asyncio.create_task(self.active_engine.generate(
+                prompt=prompt, system_prompt=system_prompt, temperature=temperature,
+                max_tokens=max_tokens, stream=stream, messages=messages
+            ))
+            await asyncio.wait({embed_task, gen_task}, return_when=asyncio.FIRST_COMPLETED)
+
+            embedding = embed_task.result() if embed_task.done() else None
+            if embedding and not gen_task.done():
+                similar = self.response_cache.find_similar(system_prompt, temperature, embedding)
+                if similar is not None:
+                    gen_task.cancel()
+                    try:
+                        await gen_task
+                    except asyncio.CancelledError:
+                        pass
+                    return similar
+
+            response = await gen_task
+            if response and not response.startswith("Error"):
+                self.response_cache.put(key, system_prompt, temperature, embedding, response)
+                if embedding is None:
+                    # Generation won the race; backfill the vector for
+                    # future lookups without delaying this response
+                    embed_task.add_done_callback(
+                        lambda t: self._attach_embedding(key, t)
+                    )
+            else:
+                embed_task.cancel()
+            return response
+
+        response = await self.active_engine.generate(prompt=prompt, system_prompt=system_prompt, temperature=temperature, max_tokens=max_tokens, stream=stream, messages=messages)
+        if response and not response.startswith("Error"):
+            self.response_cache.put(key, system_prompt, temperature, None, response)
+        return response
+
+    async def _embed_for_cache(self, prompt: str) -> Optional[List[float]]:
+        """Embedding for the semantic cache; failures just skip the tier"""
+        try:
+            return await self.active_engine.embeddings(prompt)
+        except Exception:
+            return None
+
+    def _attach_embedding(self, key: bytes, task: "asyncio.Task") -> None:
+        if task.cancelled() or task.exception() is not None:
+            return
+        embedding = task.result()
+        if embedding:
+            self.response_cache.attach_embedding(key, embedding)
         
-    async def generate_stream(self, *args, **kwargs):
+    def generate_stream(self, *args, **kwargs):
+        # Plain delegator: the engines' generate_stream are async generator
+        # functions, so calling them already yields an async-iterable.
+        # Wrapping this in `async def` would hand callers a coroutine that
+        # `async for` rejects.
         return self.active_engine.generate_stream(*args, **kwargs)
         
     async def generate_with_tools(self, *args, **kwargs):
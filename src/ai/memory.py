@@ -3,8 +3,13 @@ EVOS AI - Memory System
 Vector-based memory for storing and retrieving browsing history and knowledge
 """
 import asyncio
+import concurrent.futures
+import functools
 import json
 import os
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from pathlib import Path
@@ -13,6 +18,36 @@ import hashlib
 
 from config import settings
 
+# orjson is C-backed and 2-5x faster than the stdlib for these payloads
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj)
+
+    _loads = json.loads
+
+# Fast non-cryptographic hashing for IDs; collision resistance is all we
+# need, so xxh3 beats sha256 without losing anything
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Embedding outside Chroma lets us batch documents per flush, reuse vectors
+# for repeated queries, and skip Chroma's per-call default embedder
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
 # Try to import chromadb, fall back to simple SQLite if not available
 try:
     import chromadb
@@ -23,6 +58,60 @@ except ImportError:
     print("[Memory] ChromaDB not available, using SQLite fallback")
 
 
+# Single round-trip insert-or-update: SQLite resolves the conflict on url
+# itself, so there is no SELECT-then-branch race and half the statements
+SQL_UPSERT_PAGE = '''
+    INSERT INTO pages (id, url, title, domain, content, summary, first_visit, last_visit, tags, metadata, content_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        title = excluded.title,
+        content = excluded.content,
+        summary = excluded.summary,
+        last_visit = excluded.last_visit,
+        visit_count = pages.visit_count + 1,
+        tags = excluded.tags,
+        metadata = excluded.metadata,
+        content_hash = excluded.content_hash
+'''
+
+# Revisits with unchanged content only touch the small columns, so SQLite
+# doesn't rewrite the content overflow pages on every page load
+SQL_TOUCH_PAGE = '''
+    UPDATE pages SET last_visit = ?, visit_count = visit_count + 1 WHERE url = ?
+'''
+
+
+@functools.lru_cache(maxsize=64)
+def _build_search_sql(fts: bool, n_keywords: int, has_domain: bool, has_min_date: bool) -> str:
+    """Assemble keyword-search SQL once per shape; sqlite3 caches the compiled
+    statement per SQL string, so reusing strings reuses query plans"""
+    if fts:
+        sql = '''
+            SELECT p.id, p.url, p.title, p.domain, p.summary, p.last_visit, p.visit_count
+            FROM pages_fts f
+            JOIN pages p ON p.rowid = f.rowid
+            WHERE pages_fts MATCH ?
+        '''
+        if has_domain:
+            sql += " AND p.domain = ?"
+        if has_min_date:
+            sql += " AND p.last_visit >= ?"
+        sql += " ORDER BY bm25(pages_fts) LIMIT ?"
+    else:
+        like_clauses = " OR ".join(["(title LIKE ? OR content LIKE ?)"] * n_keywords)
+        sql = f'''
+            SELECT id, url, title, domain, summary, last_visit, visit_count
+            FROM pages
+            WHERE {like_clauses}
+        '''
+        if has_domain:
+            sql += " AND domain = ?"
+        if has_min_date:
+            sql += " AND last_visit >= ?"
+        sql += " ORDER BY visit_count DESC, last_visit DESC LIMIT ?"
+    return sql
+
+
 class MemoryStore:
     """
     Hybrid memory system combining:
@@ -35,20 +124,77 @@ class MemoryStore:
         self.vector_db = None
         self.collection = None
         self._initialized = False
+        # One long-lived connection instead of an open+close cycle per call;
+        # writers serialize through the lock
+        self._conn: Optional[sqlite3.Connection] = None
+        self._write_lock = asyncio.Lock()
+        # WAL allows concurrent readers alongside the writer; a small pool
+        # of read-only connections lets overlapping queries actually overlap
+        self._reader_pool: Optional[asyncio.Queue] = None
+        # Blocking sqlite3 calls run off the event loop: one writer thread
+        # (serializes naturally) and a small pool for reads
+        self._write_exec: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._read_exec: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        # Vector upserts are queued and flushed in batches: Chroma runs one
+        # transaction per call, so batching beats per-page upserts by a lot
+        self._vec_queue: Optional[asyncio.Queue] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._fts_enabled = False
+        # Browser queries repeat heavily ("docs", "python asyncio", ...), and
+        # every collection.query re-embeds the query string. Memoize whole
+        # query results for a short window; flushes invalidate the cache.
+        self._vector_cache: Dict[tuple, tuple] = {}
+        # collection.count() is an aggregate query under Chroma and search()
+        # needed it twice per call; cache it briefly
+        self._vec_count_cache = (0, 0.0)  # (count, fetched_at)
+        # Local encoder + per-text vector cache; None means Chroma embeds
+        self._encoder = None
+        self._embed_cache: Dict[str, List[float]] = {}
+        # Stats counters kept in memory: /health polls get_stats every few
+        # seconds and COUNT(*) is O(N) in SQLite. Loaded once at init,
+        # bumped by the mutators.
+        self._page_domains: Counter = Counter()
+        self._total_pages = 0
+        self._total_entities = 0
+        self._total_notes = 0
+        self._total_visits = 0
         
     async def initialize(self) -> bool:
         """Initialize the memory system"""
         try:
             # Ensure directory exists
             os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+            self._write_exec = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='mem-writer'
+            )
+            self._read_exec = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.READER_POOL_SIZE, thread_name_prefix='mem-reader'
+            )
             
             # Initialize SQLite
             self._init_sqlite()
-            
+            self._load_stats()
+
             # Initialize ChromaDB if available
             if CHROMADB_AVAILABLE:
                 self._init_chromadb()
-            
+
+            # Local embedding model so queries and document batches skip
+            # Chroma's per-call default embedder
+            if self.collection is not None and SENTENCE_TRANSFORMERS_AVAILABLE:
+                try:
+                    self._encoder = SentenceTransformer(settings.embedding_model)
+                    print(f"[Memory] Embedding locally with {settings.embedding_model}")
+                except Exception as e:
+                    print(f"[Memory] Local embedder unavailable, Chroma will embed: {e}")
+                    self._encoder = None
+
+            # Background flusher for batched vector upserts
+            if self.collection is not None:
+                self._vec_queue = asyncio.Queue()
+                self._flush_task = asyncio.create_task(self._flush_loop())
+
             self._initialized = True
             print(f"[Memory] Initialized at {self.db_path}")
             return True
@@ -59,9 +205,27 @@ class MemoryStore:
     
     def _init_sqlite(self):
         """Initialize SQLite database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        # autocommit mode (isolation_level=None): explicit BEGIN/COMMIT for
+        # multi-statement writes, no hidden transaction management
+        self._conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        # Row factory lets result dicts come straight from dict(row) instead
+        # of hand-built literals per query
+        self._conn.row_factory = sqlite3.Row
+        cursor = self._conn.cursor()
+
+        # WAL + pragma tuning: readers don't block the writer, commits skip
+        # the full fsync-per-transaction of the default journal mode
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA mmap_size=268435456')
+        cursor.execute('PRAGMA cache_size=-65536')
+        cursor.execute('PRAGMA busy_timeout=5000')
+
         # Pages table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS pages (
@@ -76,9 +240,16 @@ class MemoryStore:
                 visit_count INTEGER DEFAULT 1,
                 importance_score REAL DEFAULT 0.5,
                 tags TEXT,
-                metadata TEXT
+                metadata TEXT,
+                content_hash TEXT
             )
         ''')
+
+        # Migration for databases created before content_hash existed
+        try:
+            cursor.execute('ALTER TABLE pages ADD COLUMN content_hash TEXT')
+        except sqlite3.OperationalError:
+            pass  # column already present
         
         # Entities table (people, products, concepts extracted from pages)
         cursor.execute('''
@@ -125,10 +296,131 @@ class MemoryStore:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_pages_last_visit ON pages(last_visit)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_entities_name ON entities(name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_entities_type ON entities(type)')
-        
-        conn.commit()
-        conn.close()
+
+        # Covering indexes: get_recent and the get_related fallback read
+        # every returned column from the index, no heap fetches
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pages_recent_cov
+            ON pages(last_visit DESC, id, url, title, domain, summary, visit_count)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pages_domain_popular
+            ON pages(domain, visit_count DESC, id, url, title)
+        ''')
+
+        # Reader pool: WAL readers never block the writer or each other
+        self._reader_pool = asyncio.Queue()
+        for _ in range(self.READER_POOL_SIZE):
+            reader = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            reader.row_factory = sqlite3.Row
+            rc = reader.cursor()
+            rc.execute('PRAGMA synchronous=NORMAL')
+            rc.execute('PRAGMA temp_store=MEMORY')
+            rc.execute('PRAGMA mmap_size=268435456')
+            rc.execute('PRAGMA cache_size=-65536')
+            rc.execute('PRAGMA busy_timeout=5000')
+            self._reader_pool.put_nowait(reader)
+
+        # FTS5 index over pages: MATCH queries use the inverted index instead
+        # of scanning every row with LIKE. External-content table so the text
+        # is stored once; triggers keep it in sync with pages.
+        try:
+            # Plain SELECTs on an external-content FTS table read through to
+            # pages, so "is the index populated" can't be asked after the
+            # fact; note whether the table exists before creating it
+            fts_missing = not cursor.execute(
+                "SELECT EXISTS(SELECT 1 FROM sqlite_master WHERE type='table' AND name='pages_fts')"
+            ).fetchone()[0]
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+                    title, content,
+                    content='pages',
+                    content_rowid='rowid',
+                    tokenize='porter unicode61'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS pages_fts_insert AFTER INSERT ON pages BEGIN
+                    INSERT INTO pages_fts(rowid, title, content)
+                    VALUES (new.rowid, new.title, new.content);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS pages_fts_delete AFTER DELETE ON pages BEGIN
+                    INSERT INTO pages_fts(pages_fts, rowid, title, content)
+                    VALUES ('delete', old.rowid, old.title, old.content);
+                END
+            ''')
+            # Scoped to the indexed columns: the touch-only revisit path
+            # bumps last_visit/visit_count and must not re-tokenize 50KB
+            # of unchanged content. Drop first so databases created with
+            # the old unscoped trigger pick up the new definition.
+            cursor.execute('DROP TRIGGER IF EXISTS pages_fts_update')
+            cursor.execute('''
+                CREATE TRIGGER pages_fts_update
+                AFTER UPDATE OF title, content ON pages BEGIN
+                    INSERT INTO pages_fts(pages_fts, rowid, title, content)
+                    VALUES ('delete', old.rowid, old.title, old.content);
+                    INSERT INTO pages_fts(rowid, title, content)
+                    VALUES (new.rowid, new.title, new.content);
+                END
+            ''')
+            # Backfill for databases that predate the FTS table: without it,
+            # pre-existing pages are invisible to MATCH and the triggers
+            # issue 'delete' ops for rows that were never indexed, which
+            # corrupts the index on the first update
+            if fts_missing and cursor.execute(
+                'SELECT EXISTS(SELECT 1 FROM pages)'
+            ).fetchone()[0]:
+                print("[Memory] Building FTS index for existing pages...")
+                cursor.execute("INSERT INTO pages_fts(pages_fts) VALUES('rebuild')")
+            self._fts_enabled = True
+        except sqlite3.OperationalError as e:
+            print(f"[Memory] FTS5 not available, keyword search falls back to LIKE: {e}")
+            self._fts_enabled = False
     
+    READER_POOL_SIZE = 4
+
+    @asynccontextmanager
+    async def _reader(self):
+        """Borrow a read connection from the pool"""
+        conn = await self._reader_pool.get()
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put_nowait(conn)
+
+    async def _awrite(self, fn, *args):
+        """Run blocking write work on the dedicated writer thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._write_exec, fn, *args)
+
+    async def _aread(self, fn, *args):
+        """Run blocking read work on the reader thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._read_exec, fn, *args)
+
+    def _load_stats(self):
+        """Seed the in-memory stats counters from the database"""
+        cursor = self._conn.cursor()
+
+        self._page_domains = Counter()
+        self._total_pages = 0
+        self._total_visits = 0
+        cursor.execute('SELECT domain, COUNT(*), SUM(visit_count) FROM pages GROUP BY domain')
+        for row in cursor:
+            self._page_domains[row[0]] = row[1]
+            self._total_pages += row[1]
+            self._total_visits += row[2] or 0
+
+        cursor.execute('SELECT COUNT(*) FROM entities')
+        self._total_entities = cursor.fetchone()[0]
+
+        cursor.execute('SELECT COUNT(*) FROM notes')
+        self._total_notes = cursor.fetchone()[0]
+
     def _init_chromadb(self):
         """Initialize ChromaDB for vector search"""
         try:
@@ -141,15 +433,170 @@ class MemoryStore:
                 name="pages",
                 metadata={"hnsw:space": "cosine"}
             )
-            print(f"[Memory] ChromaDB initialized with {self.collection.count()} documents")
+            count = self.collection.count()
+            self._vec_count_cache = (count, time.monotonic())
+            print(f"[Memory] ChromaDB initialized with {count} documents")
         except Exception as e:
             print(f"[Memory] ChromaDB initialization failed: {e}")
             self.vector_db = None
             self.collection = None
     
+    # Batch up to this many queued upserts, or whatever arrived within the
+    # flush window — the 50-250 range is where Chroma batching pays off
+    FLUSH_BATCH_SIZE = 128
+    FLUSH_INTERVAL = 0.5
+
+    async def _flush_loop(self):
+        """Drain queued vector upserts into batched collection.upsert calls"""
+        while True:
+            item = await self._vec_queue.get()
+            ids, docs, metas = [item[0]], [item[1]], [item[2]]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.FLUSH_INTERVAL
+            while len(ids) < self.FLUSH_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    nxt = await asyncio.wait_for(self._vec_queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                ids.append(nxt[0])
+                docs.append(nxt[1])
+                metas.append(nxt[2])
+            # Encoding a batch plus the sync upsert can take seconds; keep
+            # it off the event loop so requests aren't stalled behind it
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._flush_vectors, ids, docs, metas
+            )
+
+    def _flush_vectors(self, ids, docs, metas):
+        try:
+            embeddings = self._embed(docs)
+            if embeddings is not None:
+                self.collection.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=embeddings)
+            else:
+                self.collection.upsert(ids=ids, documents=docs, metadatas=metas)
+            self._vector_cache.clear()
+            # Upserts may be inserts or updates; force a recount on next read
+            self._vec_count_cache = (0, 0.0)
+        except Exception as e:
+            print(f"[Memory] Vector store error: {e}")
+
+    EMBED_CACHE_MAX = 512
+
+    def _embed(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Encode texts locally, reusing cached vectors for repeated inputs"""
+        if self._encoder is None:
+            return None
+
+        vecs: List[Optional[List[float]]] = []
+        to_encode = []
+        missing = []
+        for i, text in enumerate(texts):
+            cached = self._embed_cache.get(text)
+            vecs.append(cached)
+            if cached is None:
+                to_encode.append(text)
+                missing.append(i)
+
+        if to_encode:
+            encoded = self._encoder.encode(to_encode, normalize_embeddings=True)
+            for i, vec in zip(missing, encoded):
+                value = vec.tolist()
+                vecs[i] = value
+                if len(self._embed_cache) >= self.EMBED_CACHE_MAX:
+                    self._embed_cache.pop(next(iter(self._embed_cache)))
+                self._embed_cache[texts[i]] = value
+
+        return vecs
+
+    VEC_COUNT_TTL = 5.0
+
+    def _vec_count(self) -> int:
+        """collection.count() with a short TTL; flushes invalidate it"""
+        count, fetched_at = self._vec_count_cache
+        now = time.monotonic()
+        if now - fetched_at > self.VEC_COUNT_TTL:
+            count = self.collection.count()
+            self._vec_count_cache = (count, now)
+        return count
+
+    VECTOR_CACHE_TTL = 60.0
+    VECTOR_CACHE_MAX = 256
+
+    def _vector_query(self, query_text: str, n_results: int, exclude_url: Optional[str] = None):
+        """collection.query with short-TTL result memoization (skips re-embedding)"""
+        key = (query_text, n_results, exclude_url)
+        now = time.monotonic()
+        hit = self._vector_cache.get(key)
+        if hit and now - hit[0] < self.VECTOR_CACHE_TTL:
+            return hit[1]
+
+        query_vecs = self._embed([query_text])
+        if query_vecs is not None:
+            kwargs = {"query_embeddings": query_vecs, "n_results": n_results}
+        else:
+            kwargs = {"query_texts": [query_text], "n_results": n_results}
+        if exclude_url:
+            kwargs["where"] = {"url": {"$ne": exclude_url}}
+        result = self.collection.query(**kwargs)
+
+        if len(self._vector_cache) >= self.VECTOR_CACHE_MAX:
+            oldest = min(self._vector_cache, key=lambda k: self._vector_cache[k][0])
+            del self._vector_cache[oldest]
+        self._vector_cache[key] = (now, result)
+        return result
+
+    async def close(self):
+        """Flush pending vector writes and stop the background task"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._vec_queue:
+            ids, docs, metas = [], [], []
+            while not self._vec_queue.empty():
+                pid, doc, meta = self._vec_queue.get_nowait()
+                ids.append(pid)
+                docs.append(doc)
+                metas.append(meta)
+            if ids:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._flush_vectors, ids, docs, metas
+                )
+        if self._reader_pool is not None:
+            while not self._reader_pool.empty():
+                self._reader_pool.get_nowait().close()
+        if self._conn is not None:
+            try:
+                self._conn.execute('PRAGMA optimize')
+            except sqlite3.Error:
+                pass
+            self._conn.close()
+            self._conn = None
+        if self._write_exec is not None:
+            self._write_exec.shutdown(wait=False)
+            self._write_exec = None
+        if self._read_exec is not None:
+            self._read_exec.shutdown(wait=False)
+            self._read_exec = None
+
     def _generate_id(self, content: str) -> str:
         """Generate a unique ID based on content"""
+        if XXHASH_AVAILABLE:
+            return xxhash.xxh3_128_hexdigest(content.encode())[:16]
         return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _hash_content(data: bytes) -> str:
+        """Cheap fingerprint for change detection on revisits"""
+        if XXHASH_AVAILABLE:
+            return xxhash.xxh3_64_hexdigest(data)
+        return hashlib.sha256(data).hexdigest()[:16]
     
     async def remember_page(
         self,
@@ -167,83 +614,160 @@ class MemoryStore:
         page_id = self._generate_id(url)
         domain = urlparse(url).netloc
         now = datetime.now().isoformat()
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Check if page exists
-        cursor.execute('SELECT id, visit_count FROM pages WHERE url = ?', (url,))
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Update existing page
-            cursor.execute('''
-                UPDATE pages SET
-                    title = ?,
-                    content = ?,
-                    summary = ?,
-                    last_visit = ?,
-                    visit_count = visit_count + 1,
-                    tags = ?,
-                    metadata = ?
-                WHERE url = ?
-            ''', (
-                title,
-                content[:50000],  # Limit content size
-                summary,
-                now,
-                json.dumps(tags or []),
-                json.dumps(metadata or {}),
-                url
-            ))
-            page_id = existing[0]
-        else:
-            # Insert new page
-            cursor.execute('''
-                INSERT INTO pages (id, url, title, domain, content, summary, first_visit, last_visit, tags, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+
+        # Encode once and slice bytes: the 50 KB cap is a storage budget, so
+        # it should count bytes, and this avoids re-walking the full string
+        # for each truncation ('ignore' drops a split trailing codepoint)
+        content_bytes = content.encode('utf-8')
+        stored_content = content_bytes[:50000].decode('utf-8', 'ignore')
+        content_hash = self._hash_content(content_bytes)
+
+        def _txn():
+            cursor = self._conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Unchanged revisits skip the 50 KB content rewrite (and the
+                # re-embedding downstream); only the cheap columns move
+                cursor.execute('SELECT id, content_hash FROM pages WHERE url = ?', (url,))
+                existing = cursor.fetchone()
+                same = existing is not None and existing['content_hash'] == content_hash
+
+                if same:
+                    cursor.execute(SQL_TOUCH_PAGE, (now, url))
+                    stored_id = existing['id']
+                    visits = 0  # not a fresh insert
+                else:
+                    cursor.execute(SQL_UPSERT_PAGE, (
+                        page_id,
+                        url,
+                        title,
+                        domain,
+                        stored_content,
+                        summary,
+                        now,
+                        now,
+                        _dumps(tags or []),
+                        _dumps(metadata or {}),
+                        content_hash
+                    ))
+                    # Rows stored before the hash scheme changed keep their old ID
+                    cursor.execute('SELECT id, visit_count FROM pages WHERE url = ?', (url,))
+                    stored_id, visits = cursor.fetchone()
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            return stored_id, visits, same
+
+        async with self._write_lock:
+            page_id, visit_count, unchanged = await self._awrite(_txn)
+
+            if visit_count == 1:  # first visit means a fresh insert
+                self._total_pages += 1
+                self._page_domains[domain] += 1
+            self._total_visits += 1
+
+        # Queue for the vector store; the background flusher batches upserts
+        if self._vec_queue is not None and not unchanged:
+            # Create a searchable text
+            search_text = f"{title}\n{summary or ''}\n{content_bytes[:2000].decode('utf-8', 'ignore')}"
+            self._vec_queue.put_nowait((
                 page_id,
-                url,
-                title,
-                domain,
-                content[:50000],
-                summary,
-                now,
-                now,
-                json.dumps(tags or []),
-                json.dumps(metadata or {})
+                search_text,
+                {
+                    "url": url,
+                    "title": title,
+                    "domain": domain,
+                    "timestamp": now
+                }
             ))
         
-        conn.commit()
-        conn.close()
-        
-        # Add to vector store for semantic search
-        if self.collection:
-            try:
-                # Create a searchable text
-                search_text = f"{title}\n{summary or ''}\n{content[:2000]}"
-                
-                self.collection.upsert(
-                    ids=[page_id],
-                    documents=[search_text],
-                    metadatas=[{
-                        "url": url,
-                        "title": title,
-                        "domain": domain,
-                        "timestamp": now
-                    }]
-                )
-            except Exception as e:
-                print(f"[Memory] Vector store error: {e}")
-        
         return {
             "id": page_id,
             "url": url,
             "title": title,
             "stored": True
         }
-    
+
+    async def remember_pages(self, pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store several pages in one transaction (one fsync for the whole batch)
+
+        Each entry takes the same keys as remember_page: url, title, content
+        and optionally summary, tags, metadata.
+        """
+        from urllib.parse import urlparse
+
+        now = datetime.now().isoformat()
+        rows = []
+        doc_texts = []
+        for p in pages:
+            url = p["url"]
+            content_bytes = (p.get("content") or "").encode('utf-8')
+            doc_texts.append(content_bytes[:2000].decode('utf-8', 'ignore'))
+            rows.append((
+                self._generate_id(url),
+                url,
+                p.get("title", ""),
+                urlparse(url).netloc,
+                content_bytes[:50000].decode('utf-8', 'ignore'),
+                p.get("summary"),
+                now,
+                now,
+                _dumps(p.get("tags") or []),
+                _dumps(p.get("metadata") or {}),
+                self._hash_content(content_bytes)
+            ))
+
+        urls = [r[1] for r in rows]
+
+        def _txn():
+            cursor = self._conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.executemany(SQL_UPSERT_PAGE, rows)
+                placeholders = ",".join("?" * len(urls))
+                cursor.execute(f'SELECT url, id, visit_count, domain FROM pages WHERE url IN ({placeholders})', urls)
+                fetched = cursor.fetchall()
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            return fetched
+
+        async with self._write_lock:
+            stored = await self._awrite(_txn)
+            ids_by_url = {r['url']: r['id'] for r in stored}
+
+            for r in stored:
+                if r['visit_count'] == 1:
+                    self._total_pages += 1
+                    self._page_domains[r['domain']] += 1
+                self._total_visits += 1
+
+        results = []
+        for p, row, doc_text in zip(pages, rows, doc_texts):
+            page_id = ids_by_url[row[1]]
+            if self._vec_queue is not None:
+                search_text = f"{row[2]}\n{p.get('summary') or ''}\n{doc_text}"
+                self._vec_queue.put_nowait((
+                    page_id,
+                    search_text,
+                    {
+                        "url": row[1],
+                        "title": row[2],
+                        "domain": row[3],
+                        "timestamp": now
+                    }
+                ))
+            results.append({
+                "id": page_id,
+                "url": row[1],
+                "title": row[2],
+                "stored": True
+            })
+
+        return results
+
     async def search(
         self,
         query: str,
@@ -252,133 +776,117 @@ class MemoryStore:
         min_date: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Search memory using semantic similarity"""
-        
-        results = []
-        
-        # Vector search if available
-        if self.collection and self.collection.count() > 0:
-            try:
-                vector_results = self.collection.query(
-                    query_texts=[query],
-                    n_results=min(limit, self.collection.count())
-                )
-                
-                for i, doc_id in enumerate(vector_results['ids'][0]):
-                    metadata = vector_results['metadatas'][0][i]
-                    results.append({
-                        "id": doc_id,
-                        "url": metadata.get("url"),
-                        "title": metadata.get("title"),
-                        "domain": metadata.get("domain"),
-                        "score": 1 - (vector_results['distances'][0][i] if vector_results.get('distances') else 0),
-                        "source": "vector"
-                    })
-            except Exception as e:
-                print(f"[Memory] Vector search error: {e}")
-        
-        # Fallback/supplement with SQLite full-text search
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Simple keyword search
-        keywords = query.lower().split()
-        like_clauses = " OR ".join([f"(title LIKE ? OR content LIKE ?)" for _ in keywords])
-        params = []
-        for kw in keywords:
-            params.extend([f"%{kw}%", f"%{kw}%"])
-        
-        sql = f'''
-            SELECT id, url, title, domain, summary, last_visit, visit_count
-            FROM pages
-            WHERE {like_clauses}
-        '''
-        
-        if domain:
-            sql += " AND domain = ?"
-            params.append(domain)
-        
-        if min_date:
-            sql += " AND last_visit >= ?"
-            params.append(min_date)
-        
-        sql += " ORDER BY visit_count DESC, last_visit DESC LIMIT ?"
-        params.append(limit)
-        
-        cursor.execute(sql, params)
-        
-        for row in cursor.fetchall():
-            # Check if already in results
-            if not any(r['id'] == row[0] for r in results):
-                results.append({
-                    "id": row[0],
-                    "url": row[1],
-                    "title": row[2],
-                    "domain": row[3],
-                    "summary": row[4],
-                    "last_visit": row[5],
-                    "visit_count": row[6],
-                    "source": "keyword"
-                })
-        
-        conn.close()
-        
+
+        def _vector_branch() -> List[Dict[str, Any]]:
+            hits = []
+            if self.collection and self._vec_count() > 0:
+                try:
+                    vector_results = self._vector_query(
+                        query,
+                        min(limit, self._vec_count())
+                    )
+
+                    for i, doc_id in enumerate(vector_results['ids'][0]):
+                        metadata = vector_results['metadatas'][0][i]
+                        hits.append({
+                            "id": doc_id,
+                            "url": metadata.get("url"),
+                            "title": metadata.get("title"),
+                            "domain": metadata.get("domain"),
+                            "score": 1 - (vector_results['distances'][0][i] if vector_results.get('distances') else 0),
+                            "source": "vector"
+                        })
+                except Exception as e:
+                    print(f"[Memory] Vector search error: {e}")
+            return hits
+
+        def _keyword_branch(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+            cursor = conn.cursor()
+
+            keywords = query.lower().split()
+            sql = _build_search_sql(self._fts_enabled, len(keywords), bool(domain), bool(min_date))
+
+            if self._fts_enabled:
+                # FTS5 MATCH with bm25 relevance ranking; each keyword is quoted
+                # so punctuation can't be parsed as FTS query syntax
+                match_expr = " OR ".join('"' + kw.replace('"', '""') + '"' for kw in keywords)
+                params = [match_expr]
+            else:
+                # Simple keyword search
+                params = []
+                for kw in keywords:
+                    params.extend([f"%{kw}%", f"%{kw}%"])
+
+            if domain:
+                params.append(domain)
+            if min_date:
+                params.append(min_date)
+            params.append(limit)
+
+            cursor.execute(sql, params)
+            return [dict(row) for row in cursor]
+
+        # The branches are independent and both block (Chroma embeds, SQLite
+        # scans), so overlap them: latency becomes max(vec, sql) not vec+sql
+        async with self._reader() as rconn:
+            results, keyword_rows = await asyncio.gather(
+                self._aread(_vector_branch),
+                self._aread(_keyword_branch, rconn)
+            )
+
+        # Set-based dedup against vector hits: O(1) per row instead of a
+        # scan of results for every keyword match
+        seen_ids = {r['id'] for r in results}
+        for record in keyword_rows:
+            if record['id'] in seen_ids:
+                continue
+            seen_ids.add(record['id'])
+            record["source"] = "keyword"
+            results.append(record)
+
         return results[:limit]
     
     async def get_page(self, url: str) -> Optional[Dict[str, Any]]:
         """Get a specific page from memory"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, url, title, domain, content, summary, first_visit, last_visit, visit_count, tags, metadata
-            FROM pages WHERE url = ?
-        ''', (url,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
+        def _fetch(conn: sqlite3.Connection):
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, url, title, domain, content, summary, first_visit, last_visit, visit_count, tags, metadata
+                FROM pages WHERE url = ?
+            ''', (url,))
+            return cursor.fetchone()
+
+        async with self._reader() as conn:
+            row = await self._aread(_fetch, conn)
+
         if row:
-            return {
-                "id": row[0],
-                "url": row[1],
-                "title": row[2],
-                "domain": row[3],
-                "content": row[4],
-                "summary": row[5],
-                "first_visit": row[6],
-                "last_visit": row[7],
-                "visit_count": row[8],
-                "tags": json.loads(row[9] or "[]"),
-                "metadata": json.loads(row[10] or "{}")
-            }
+            page = dict(row)
+            page["tags"] = _loads(page["tags"] or "[]")
+            page["metadata"] = _loads(page["metadata"] or "{}")
+            return page
         return None
     
+    def _id_for_url(self, url: str) -> Optional[str]:
+        """Fetch just the stored ID for a URL (no 50 KB content column)"""
+        cursor = self._conn.cursor()
+        cursor.execute('SELECT id FROM pages WHERE url = ?', (url,))
+        row = cursor.fetchone()
+        return row['id'] if row else None
+
     async def get_recent(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get recently visited pages"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, url, title, domain, summary, last_visit, visit_count
-            FROM pages
-            ORDER BY last_visit DESC
-            LIMIT ?
-        ''', (limit,))
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                "id": row[0],
-                "url": row[1],
-                "title": row[2],
-                "domain": row[3],
-                "summary": row[4],
-                "last_visit": row[5],
-                "visit_count": row[6]
-            })
-        
-        conn.close()
-        return results
+        def _fetch(conn: sqlite3.Connection):
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, url, title, domain, summary, last_visit, visit_count
+                FROM pages
+                ORDER BY last_visit DESC
+                LIMIT ?
+            ''', (limit,))
+            return [dict(row) for row in cursor]
+
+        async with self._reader() as conn:
+            return await self._aread(_fetch, conn)
     
     async def get_related(self, url: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Get pages related to a given URL"""
@@ -392,10 +900,11 @@ class MemoryStore:
         if self.collection:
             try:
                 search_text = f"{page['title']}\n{page.get('summary', '')}"
-                results = self.collection.query(
-                    query_texts=[search_text],
-                    n_results=limit + 1,  # +1 to exclude self
-                    where={"url": {"$ne": url}}
+                results = await self._aread(
+                    self._vector_query,
+                    search_text,
+                    limit + 1,  # +1 to exclude self
+                    url
                 )
                 
                 related = []
@@ -413,20 +922,18 @@ class MemoryStore:
                 print(f"[Memory] Related search error: {e}")
         
         # Fallback: same domain
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, url, title FROM pages
-            WHERE domain = ? AND url != ?
-            ORDER BY visit_count DESC
-            LIMIT ?
-        ''', (page['domain'], url, limit))
-        
-        results = [{"id": r[0], "url": r[1], "title": r[2]} for r in cursor.fetchall()]
-        conn.close()
-        
-        return results
+        def _fetch(conn: sqlite3.Connection):
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, url, title FROM pages
+                WHERE domain = ? AND url != ?
+                ORDER BY visit_count DESC
+                LIMIT ?
+            ''', (page['domain'], url, limit))
+            return [dict(row) for row in cursor]
+
+        async with self._reader() as conn:
+            return await self._aread(_fetch, conn)
     
     async def add_note(
         self,
@@ -437,85 +944,94 @@ class MemoryStore:
         """Add a note to a page"""
         
         # Get page ID
-        page = await self.get_page(page_url)
-        if not page:
+        page_id = self._id_for_url(page_url)
+        if not page_id:
             return {"error": "Page not found in memory"}
-        
+
         note_id = self._generate_id(f"{page_url}:{content}:{datetime.now().isoformat()}")
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO notes (id, page_id, content, created_at, tags)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            note_id,
-            page['id'],
-            content,
-            datetime.now().isoformat(),
-            json.dumps(tags or [])
-        ))
-        
-        conn.commit()
-        conn.close()
-        
+
+        def _insert():
+            cursor = self._conn.cursor()
+            cursor.execute('''
+                INSERT INTO notes (id, page_id, content, created_at, tags)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (
+                note_id,
+                page_id,
+                content,
+                datetime.now().isoformat(),
+                _dumps(tags or [])
+            ))
+
+        async with self._write_lock:
+            await self._awrite(_insert)
+            self._total_notes += 1
+
         return {
             "id": note_id,
-            "page_id": page['id'],
+            "page_id": page_id,
             "content": content,
             "created": True
         }
     
     async def get_stats(self) -> Dict[str, Any]:
         """Get memory statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        stats = {}
-        
-        cursor.execute('SELECT COUNT(*) FROM pages')
-        stats['total_pages'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(DISTINCT domain) FROM pages')
-        stats['unique_domains'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM entities')
-        stats['total_entities'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM notes')
-        stats['total_notes'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT SUM(visit_count) FROM pages')
-        stats['total_visits'] = cursor.fetchone()[0] or 0
-        
+        stats = {
+            'total_pages': self._total_pages,
+            'unique_domains': len(self._page_domains),
+            'total_entities': self._total_entities,
+            'total_notes': self._total_notes,
+            'total_visits': self._total_visits
+        }
+
         if self.collection:
-            stats['vector_documents'] = self.collection.count()
-        
-        conn.close()
+            stats['vector_documents'] = self._vec_count()
+
         return stats
     
     async def delete_page(self, url: str) -> bool:
         """Delete a page from memory"""
-        page = await self.get_page(url)
-        if not page:
+        page_id = self._id_for_url(url)
+        if not page_id:
             return False
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Delete related data
-        cursor.execute('DELETE FROM page_entities WHERE page_id = ?', (page['id'],))
-        cursor.execute('DELETE FROM notes WHERE page_id = ?', (page['id'],))
-        cursor.execute('DELETE FROM pages WHERE id = ?', (page['id'],))
-        
-        conn.commit()
-        conn.close()
-        
+
+        def _txn():
+            cursor = self._conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('SELECT domain, visit_count FROM pages WHERE id = ?', (page_id,))
+                row = cursor.fetchone()
+                cursor.execute('SELECT COUNT(*) FROM notes WHERE page_id = ?', (page_id,))
+                notes = cursor.fetchone()[0]
+
+                # Delete related data
+                cursor.execute('DELETE FROM page_entities WHERE page_id = ?', (page_id,))
+                cursor.execute('DELETE FROM notes WHERE page_id = ?', (page_id,))
+                cursor.execute('DELETE FROM pages WHERE id = ?', (page_id,))
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            return row, notes
+
+        async with self._write_lock:
+            page_row, note_count = await self._awrite(_txn)
+
+            if page_row:
+                self._total_pages -= 1
+                self._total_visits -= page_row['visit_count']
+                self._page_domains[page_row['domain']] -= 1
+                if self._page_domains[page_row['domain']] <= 0:
+                    del self._page_domains[page_row['domain']]
+            self._total_notes -= note_count
+
         # Remove from vector store
         if self.collection:
             try:
-                self.collection.delete(ids=[page['id']])
+                self.collection.delete(ids=[page_id])
+                self._vector_cache.clear()
+                count, fetched_at = self._vec_count_cache
+                self._vec_count_cache = (max(count - 1, 0), fetched_at)
             except:
                 pass
         
@@ -523,16 +1039,27 @@ class MemoryStore:
     
     async def clear_all(self) -> bool:
         """Clear all memory data"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM page_entities')
-        cursor.execute('DELETE FROM entities')
-        cursor.execute('DELETE FROM notes')
-        cursor.execute('DELETE FROM pages')
-        
-        conn.commit()
-        conn.close()
+        def _txn():
+            cursor = self._conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('DELETE FROM page_entities')
+                cursor.execute('DELETE FROM entities')
+                cursor.execute('DELETE FROM notes')
+                cursor.execute('DELETE FROM pages')
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+
+        async with self._write_lock:
+            await self._awrite(_txn)
+
+            self._page_domains = Counter()
+            self._total_pages = 0
+            self._total_entities = 0
+            self._total_notes = 0
+            self._total_visits = 0
         
         # Clear vector store
         if self.vector_db and self.collection:
@@ -542,6 +1069,8 @@ class MemoryStore:
                     name="pages",
                     metadata={"hnsw:space": "cosine"}
                 )
+                self._vector_cache.clear()
+                self._vec_count_cache = (0, time.monotonic())
             except:
                 pass
         
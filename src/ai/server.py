@@ -3,21 +3,31 @@ EVOS AI - FastAPI Server
 HTTP API for communication between Electron and Python AI backend
 """
 import asyncio
+import gzip
+import hashlib
 import json
 import os
 import sys
 from typing import Dict, Any, List, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
+# orjson-backed responses when available; serialization dominates for the
+# larger /memory payloads
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as DefaultJSONResponse
+
 from config import settings
 from llm_engine import llm_engine
 from agent import agent, simple_agent, AgentStep
 from memory import memory
-from tools import BrowserTools, BROWSER_EXECUTOR_JS
+from tools import BrowserTools, get_browser_executor_js_min
 
 
 # Request/Response Models
@@ -86,6 +96,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("[Server] Shutting down...")
     await llm_engine.close()
+    await memory.close()
 
 
 # Create FastAPI app
@@ -93,7 +104,8 @@ app = FastAPI(
     title="EVOS AI Backend",
     description="Local AI backend for EVOS Browser",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=DefaultJSONResponse
 )
 
 # CORS for Electron
@@ -121,10 +133,28 @@ async def health_check():
 
 
 # Get browser executor script
+# The executor script never changes while the server runs; compress it once
+# and let webviews revalidate with an ETag instead of re-downloading
+_EXECUTOR_SRC = get_browser_executor_js_min().encode('utf-8')
+_EXECUTOR_GZ = gzip.compress(_EXECUTOR_SRC)
+_EXECUTOR_ETAG = f'"{hashlib.sha256(_EXECUTOR_SRC).hexdigest()[:16]}"'
+
+
 @app.get("/tools/executor")
-async def get_executor_script():
+async def get_executor_script(request: Request):
     """Get the JavaScript to inject into webviews for tool execution"""
-    return {"script": BROWSER_EXECUTOR_JS}
+    headers = {
+        "ETag": _EXECUTOR_ETAG,
+        "Cache-Control": "public, max-age=86400, immutable"
+    }
+    if request.headers.get("if-none-match") == _EXECUTOR_ETAG:
+        return Response(status_code=304, headers=headers)
+    headers["Content-Encoding"] = "gzip"
+    return Response(
+        content=_EXECUTOR_GZ,
+        media_type="application/javascript",
+        headers=headers
+    )
 
 
 # Chat endpoint
@@ -149,30 +179,66 @@ async def chat(request: ChatRequest):
         )
 
 
+async def _stream_to_queue(stream, queue: asyncio.Queue):
+    """Pull tokens from the LLM stream into the queue, collapsing adjacent
+    chunks when the consumer (a slow websocket client) falls behind"""
+    pending = None
+    async for chunk in stream:
+        if pending is not None:
+            try:
+                queue.put_nowait(pending)
+                pending = None
+            except asyncio.QueueFull:
+                pending += chunk
+                continue
+        try:
+            queue.put_nowait(chunk)
+        except asyncio.QueueFull:
+            pending = chunk
+    if pending is not None:
+        await queue.put(pending)
+    await queue.put(None)
+
+
 # Streaming chat via WebSocket
 @app.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket):
     await websocket.accept()
     connection_id = str(id(websocket))
     active_connections[connection_id] = websocket
-    
+
     try:
         while True:
             data = await websocket.receive_json()
             message = data.get("message", "")
             context = data.get("context", {})
-            
-            # Stream response
-            async for chunk in llm_engine.generate_stream(
-                prompt=message,
-                system_prompt="You are EVOS, a helpful browser assistant. Be concise."
-            ):
-                await websocket.send_json({"type": "chunk", "content": chunk})
-            
+
+            # Decouple token production from client sends: the producer
+            # fills the queue at LLM speed while the consumer drains it at
+            # socket speed, so a slow client can't stall the generator
+            queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+            producer = asyncio.create_task(_stream_to_queue(
+                llm_engine.generate_stream(
+                    prompt=message,
+                    system_prompt="You are EVOS, a helpful browser assistant. Be concise."
+                ),
+                queue
+            ))
+
+            try:
+                while (chunk := await queue.get()) is not None:
+                    await websocket.send_json({"type": "chunk", "content": chunk})
+            finally:
+                producer.cancel()
+                try:
+                    await producer
+                except asyncio.CancelledError:
+                    pass
+
             await websocket.send_json({"type": "done"})
-            
+
     except WebSocketDisconnect:
-        del active_connections[connection_id]
+        active_connections.pop(connection_id, None)
 
 
 # Agent execution
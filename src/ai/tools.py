@@ -2,10 +2,37 @@
 EVOS AI - Browser Tools
 Tools that the AI agent can use to interact with the browser
 """
-from typing import Dict, Any, Optional, List
+import functools
+import sys
+from typing import Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass
 from enum import Enum
-import json
+from pathlib import Path
+from types import MappingProxyType
+
+
+def _freeze_tool(tool: Dict[str, Any]) -> MappingProxyType:
+    """Wrap a tool definition in read-only views.
+
+    Interns the name and parameter keys so the dict lookups done on every
+    dispatch compare by pointer, and proxies the nested dicts so no caller
+    can mutate the shared catalog.
+    """
+    frozen = dict(tool)
+    frozen["name"] = sys.intern(frozen["name"])
+    frozen["parameters"] = MappingProxyType({
+        sys.intern(k): MappingProxyType(v)
+        for k, v in frozen.get("parameters", {}).items()
+    })
+    return MappingProxyType(frozen)
+
+
+def _group_by_type(defs) -> Dict[str, Tuple[MappingProxyType, ...]]:
+    """Bucket tool definitions by their ToolType value."""
+    groups: Dict[str, List[MappingProxyType]] = {t.value: [] for t in ToolType}
+    for d in defs:
+        groups[d["type"]].append(d)
+    return {k: tuple(v) for k, v in groups.items()}
 
 
 class ToolType(str, Enum):
@@ -16,13 +43,29 @@ class ToolType(str, Enum):
     SYSTEM = "system"
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolResult:
     success: bool
     data: Any = None
     error: Optional[str] = None
     screenshot: Optional[str] = None  # Base64 encoded
 
+    @classmethod
+    def from_ipc(cls, payload: Dict[str, Any]) -> "ToolResult":
+        """Build a result from a trusted executor response, no validation.
+
+        Responses from our own injected executor have a shape we control,
+        so there is nothing to check; LLM-produced payloads should keep
+        going through the normal constructor. If this ever migrates to a
+        Pydantic model, this method maps onto model_construct.
+        """
+        return cls(
+            success=payload.get("success", False),
+            data=payload.get("data"),
+            error=payload.get("error"),
+            screenshot=payload.get("screenshot"),
+        )
+
 
 class BrowserTools:
     """
@@ -30,8 +73,10 @@ class BrowserTools:
     These tools generate commands that are sent back to Electron for execution.
     """
     
-    # Tool definitions for the LLM
-    TOOL_DEFINITIONS = [
+    # Tool definitions for the LLM. The raw list stays around for JSON
+    # serialization (MappingProxyType doesn't serialize); everything else
+    # should go through the frozen TOOL_DEFINITIONS below.
+    _RAW_DEFS = [
         {
             "name": "navigate",
             "description": "Navigate to a URL or perform search",
@@ -201,31 +246,101 @@ class BrowserTools:
         }
     ]
     
+    # Read-only catalog: a stray parameters["x"]["default"] = ... in one
+    # call site would otherwise corrupt every later dispatch
+    TOOL_DEFINITIONS: Tuple[MappingProxyType, ...] = tuple(_freeze_tool(t) for t in _RAW_DEFS)
+
+    # Name lookup happens on every command dispatch; index once at import
+    _TOOL_INDEX: Dict[str, MappingProxyType] = {t["name"]: t for t in TOOL_DEFINITIONS}
+
+    # Grouping by category, also built once (ToolType's str mixin means the
+    # keys are the plain "navigation"/"extraction"/... strings)
+    _TOOLS_BY_TYPE: Dict[str, Tuple[MappingProxyType, ...]] = _group_by_type(TOOL_DEFINITIONS)
+
+    # Stable per-tool schema hashes so external validators (jsonschema,
+    # fastjsonschema) can key their compiled-validator caches without
+    # re-canonicalizing the schema on every call. Built on first use so
+    # importing this module doesn't pay for json/hashlib
+    _PARAM_SCHEMA_HASH: Optional[Dict[str, str]] = None
+
+    # Required-parameter sets per tool, derived once so validation is a
+    # set difference instead of re-walking the schema
+    _REQUIRED_PARAMS: Dict[str, frozenset] = {
+        t["name"]: frozenset(
+            k for k, v in t.get("parameters", {}).items()
+            if "default" not in v and v.get("type") != "optional"
+        )
+        for t in TOOL_DEFINITIONS
+    }
+
+    # Tools with no required parameters always validate; skip the set math
+    # for them entirely (go_back, refresh, get_page_info, ...)
+    _NO_PARAM_TOOLS: frozenset = frozenset(
+        name for name, req in _REQUIRED_PARAMS.items() if not req
+    )
+
     @classmethod
     def get_tool_definitions(cls) -> List[Dict[str, Any]]:
         """Get all tool definitions for the LLM"""
-        return cls.TOOL_DEFINITIONS
-    
+        # Raw list so response serializers don't trip on the proxies
+        return cls._RAW_DEFS
+
+    @classmethod
+    def get_tool_definitions_json(cls) -> bytes:
+        """Get the tool definitions serialized as JSON bytes (cached)"""
+        if cls._TOOL_DEFS_JSON is None:
+            import json
+            cls._TOOL_DEFS_JSON = json.dumps(cls._RAW_DEFS, default=str).encode()
+        return cls._TOOL_DEFS_JSON
+
     @classmethod
     def get_tool_by_name(cls, name: str) -> Optional[Dict[str, Any]]:
         """Get a specific tool definition"""
-        for tool in cls.TOOL_DEFINITIONS:
-            if tool["name"] == name:
-                return tool
-        return None
+        return cls._TOOL_INDEX.get(name)
+
+    @classmethod
+    def get_tools_by_type(cls, tool_type: str) -> Tuple[MappingProxyType, ...]:
+        """Get all tool definitions in a category (e.g. "extraction")"""
+        return cls._TOOLS_BY_TYPE.get(tool_type, ())
+
+    @classmethod
+    def get_param_schema_hash(cls, name: str) -> Optional[str]:
+        """Get the stable hash of a tool's parameter schema (cache key)"""
+        if cls._PARAM_SCHEMA_HASH is None:
+            import hashlib
+            import json
+            cls._PARAM_SCHEMA_HASH = {
+                t["name"]: hashlib.blake2b(
+                    json.dumps(t.get("parameters", {}), sort_keys=True, default=str).encode(),
+                    digest_size=16,
+                ).hexdigest()
+                for t in cls._RAW_DEFS
+            }
+        return cls._PARAM_SCHEMA_HASH.get(name)
     
+    # Serialized once on first use: callers shipping the catalog to an LLM
+    # API shouldn't pay a multi-KB json.dumps per request (ToolType's str
+    # mixin keeps the enum values as plain strings in the output), and
+    # importers that never ship it shouldn't pay for it at all
+    _TOOL_DEFS_JSON: Optional[bytes] = None
+
+    _formatted_prompt: Optional[str] = None
+
     @classmethod
     def format_tools_for_prompt(cls) -> str:
         """Format tool definitions for inclusion in LLM prompt"""
-        lines = ["Available tools:"]
-        for tool in cls.TOOL_DEFINITIONS:
-            params = tool.get("parameters", {})
-            param_str = ", ".join([
-                f"{k}: {v.get('type', 'any')}" 
-                for k, v in params.items()
-            ]) if params else "none"
-            lines.append(f"- {tool['name']}: {tool['description']} (params: {param_str})")
-        return "\n".join(lines)
+        # The definitions never change at runtime, so build the string once
+        if cls._formatted_prompt is None:
+            lines = ["Available tools:"]
+            for tool in cls.TOOL_DEFINITIONS:
+                params = tool.get("parameters", {})
+                param_str = ", ".join([
+                    f"{k}: {v.get('type', 'any')}"
+                    for k, v in params.items()
+                ]) if params else "none"
+                lines.append(f"- {tool['name']}: {tool['description']} (params: {param_str})")
+            cls._formatted_prompt = "\n".join(lines)
+        return cls._formatted_prompt
     
     @classmethod
     def create_command(cls, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
@@ -236,216 +351,55 @@ class BrowserTools:
             "parameters": parameters
         }
     
+    @classmethod
+    def create_batch_command(cls, calls: List[tuple]) -> Dict[str, Any]:
+        """Create a batched command: N tool calls in one IPC frame
+
+        calls is a list of (tool_name, parameters) pairs executed in order
+        by the webview executor.
+        """
+        return {
+            "type": "browser_command_batch",
+            "commands": [
+                {"tool": tool_name, "parameters": parameters}
+                for tool_name, parameters in calls
+            ]
+        }
+
     @classmethod
     def validate_parameters(cls, tool_name: str, parameters: Dict[str, Any]) -> tuple[bool, Optional[str]]:
         """Validate parameters for a tool"""
-        tool = cls.get_tool_by_name(tool_name)
-        if not tool:
+        if tool_name in cls._NO_PARAM_TOOLS:
+            return True, None
+
+        required = cls._REQUIRED_PARAMS.get(tool_name)
+        if required is None:
             return False, f"Unknown tool: {tool_name}"
-        
-        required_params = [
-            k for k, v in tool.get("parameters", {}).items()
-            if "default" not in v and v.get("type") != "optional"
-        ]
-        
-        for param in required_params:
-            if param not in parameters:
-                return False, f"Missing required parameter: {param}"
-        
+
+        missing = required - parameters.keys()
+        if missing:
+            return False, f"Missing required parameter: {min(missing)}"
+
         return True, None
 
 
-# JavaScript code to inject into webview for tool execution
-BROWSER_EXECUTOR_JS = '''
-(function() {
-    window.EVOSTools = {
-        click: async function(selector, description) {
-            let element = document.querySelector(selector);
-            if (!element && description) {
-                // Try to find by text content
-                const elements = document.querySelectorAll('*');
-                for (const el of elements) {
-                    if (el.textContent.trim().toLowerCase().includes(description.toLowerCase())) {
-                        element = el;
-                        break;
-                    }
-                }
-            }
-            if (element) {
-                element.click();
-                return { success: true };
-            }
-            return { success: false, error: 'Element not found' };
-        },
-        
-        typeText: function(selector, text, clearFirst) {
-            const element = document.querySelector(selector);
-            if (element) {
-                if (clearFirst) element.value = '';
-                element.value += text;
-                element.dispatchEvent(new Event('input', { bubbles: true }));
-                element.dispatchEvent(new Event('change', { bubbles: true }));
-                return { success: true };
-            }
-            return { success: false, error: 'Element not found' };
-        },
-        
-        scroll: function(direction, amount) {
-            const scrollAmount = amount || 500;
-            switch(direction) {
-                case 'up': window.scrollBy(0, -scrollAmount); break;
-                case 'down': window.scrollBy(0, scrollAmount); break;
-                case 'top': window.scrollTo(0, 0); break;
-                case 'bottom': window.scrollTo(0, document.body.scrollHeight); break;
-            }
-            return { success: true };
-        },
-        
-        extractText: function(selector, multiple) {
-            if (multiple) {
-                const elements = document.querySelectorAll(selector);
-                return { success: true, data: Array.from(elements).map(el => el.textContent.trim()) };
-            }
-            const element = document.querySelector(selector);
-            return element 
-                ? { success: true, data: element.textContent.trim() }
-                : { success: false, error: 'Element not found' };
-        },
-        
-        extractLinks: function(selector, filter) {
-            const container = document.querySelector(selector || 'body');
-            if (!container) return { success: false, error: 'Container not found' };
-            
-            const links = container.querySelectorAll('a[href]');
-            let results = Array.from(links).map(a => ({
-                text: a.textContent.trim(),
-                href: a.href
-            }));
-            
-            if (filter) {
-                results = results.filter(l => 
-                    l.text.toLowerCase().includes(filter.toLowerCase()) ||
-                    l.href.toLowerCase().includes(filter.toLowerCase())
-                );
-            }
-            
-            return { success: true, data: results };
-        },
-        
-        extractTable: function(selector) {
-            const table = document.querySelector(selector);
-            if (!table) return { success: false, error: 'Table not found' };
-            
-            const rows = table.querySelectorAll('tr');
-            const data = [];
-            let headers = [];
-            
-            rows.forEach((row, i) => {
-                const cells = row.querySelectorAll('td, th');
-                const rowData = Array.from(cells).map(c => c.textContent.trim());
-                if (i === 0 && row.querySelector('th')) {
-                    headers = rowData;
-                } else {
-                    if (headers.length) {
-                        const obj = {};
-                        headers.forEach((h, j) => obj[h] = rowData[j]);
-                        data.push(obj);
-                    } else {
-                        data.push(rowData);
-                    }
-                }
-            });
-            
-            return { success: true, data };
-        },
-        
-        fillForm: function(formSelector, data, submit) {
-            const form = document.querySelector(formSelector);
-            if (!form) return { success: false, error: 'Form not found' };
-            
-            for (const [key, value] of Object.entries(data)) {
-                const input = form.querySelector(`[name="${key}"], #${key}, .${key}`);
-                if (input) {
-                    input.value = value;
-                    input.dispatchEvent(new Event('input', { bubbles: true }));
-                    input.dispatchEvent(new Event('change', { bubbles: true }));
-                }
-            }
-            
-            if (submit) {
-                form.submit();
-            }
-            
-            return { success: true };
-        },
-        
-        getPageInfo: function() {
-            return {
-                success: true,
-                data: {
-                    url: window.location.href,
-                    title: document.title,
-                    description: document.querySelector('meta[name="description"]')?.content || '',
-                    text: document.body.innerText.substring(0, 10000),
-                    forms: document.querySelectorAll('form').length,
-                    links: document.querySelectorAll('a').length,
-                    inputs: document.querySelectorAll('input, textarea, select').length
-                }
-            };
-        },
-        
-        selectOption: function(selector, value) {
-            const select = document.querySelector(selector);
-            if (!select) return { success: false, error: 'Select not found' };
-            
-            // Try by value
-            let option = select.querySelector(`option[value="${value}"]`);
-            // Try by text
-            if (!option) {
-                option = Array.from(select.options).find(o => 
-                    o.textContent.trim().toLowerCase() === value.toLowerCase()
-                );
-            }
-            
-            if (option) {
-                select.value = option.value;
-                select.dispatchEvent(new Event('change', { bubbles: true }));
-                return { success: true };
-            }
-            return { success: false, error: 'Option not found' };
-        },
-        
-        hover: function(selector) {
-            const element = document.querySelector(selector);
-            if (element) {
-                element.dispatchEvent(new MouseEvent('mouseenter', { bubbles: true }));
-                element.dispatchEvent(new MouseEvent('mouseover', { bubbles: true }));
-                return { success: true };
-            }
-            return { success: false, error: 'Element not found' };
-        },
-        
-        getInteractiveElements: function() {
-            const elements = [];
-            const selectors = 'a, button, input, select, textarea, [onclick], [role="button"]';
-            document.querySelectorAll(selectors).forEach((el, i) => {
-                const rect = el.getBoundingClientRect();
-                if (rect.width > 0 && rect.height > 0) {
-                    elements.push({
-                        index: i,
-                        tag: el.tagName.toLowerCase(),
-                        type: el.type || '',
-                        text: el.textContent?.trim().substring(0, 100) || '',
-                        placeholder: el.placeholder || '',
-                        id: el.id,
-                        name: el.name,
-                        href: el.href,
-                        rect: { x: rect.x, y: rect.y, width: rect.width, height: rect.height }
-                    });
-                }
-            });
-            return { success: true, data: elements };
-        }
-    };
-})();
-'''
+# The webview executor script lives in a sibling .js file: importing this
+# module no longer parses a multi-KB Python string literal, and the script
+# can be edited (and minified at build time) as plain JavaScript.
+
+@functools.lru_cache(maxsize=1)
+def get_browser_executor_js() -> str:
+    """Load the JavaScript injected into webviews for tool execution."""
+    return (Path(__file__).parent / "browser_executor.js").read_text(encoding="utf-8")
+
+
+@functools.lru_cache(maxsize=1)
+def get_browser_executor_js_min() -> str:
+    """Minified executor script: fewer bytes across the Electron IPC bridge
+    and less V8 parse work per navigation, same behavior."""
+    source = get_browser_executor_js()
+    try:
+        import rjsmin
+    except ImportError:
+        return source
+    return rjsmin.jsmin(source)